@@ -1,138 +1,235 @@
-from flask import Flask, request, jsonify, render_template
-from DrissionPage import ChromiumPage, ChromiumOptions
-from urllib.parse import urlparse, parse_qs
+from flask import Flask, Response, request, jsonify, render_template, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from DrissionPage import ChromiumOptions
+from browser_pool import BrowserPool, run_in_tabs
+from browser_profiles import PortAllocator, ProfileCloner
+from session_pool import SessionPool, load_sessions
+from short_link import ShortLinkResolver, extract_video_id, find_url
+from video_cache import VideoUrlCache
+from crawl_state import ProfileStateStore, profile_key
+from video_store import METRICS, VideoStore
+from profile_crawler import CrawlSummary, iter_profile_videos
+from jobs import JobManager, JobQueueFull
+from scheduler import CrawlScheduler, Watchlist
+from xvfb_pool import DisplayPool
+from resource_blocking import ResourceBlocker
+from rate_limiter import HostRateLimiter, is_throttled_packet, is_verification_page
+from packet_archive import KIND_DETAIL, PacketCapture
+from video_detail import parse_detail_video_url
+from aweme_schema import VideoRecord, load_body
+from downloader import EXPIRED_STATUS_CODES, ConnectionBusy, VideoDownloader
+from media_cache import MediaCache
+from video_export import EXPORT_FORMATS, export_arrow, export_parquet, iter_csv, iter_ndjson_gz
+from metrics import REGISTRY, REQUESTS_TOTAL, Gauge, begin_request, current_timings, timed
 import json
 import os
 import sys
-import time
-import subprocess
 import signal
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
-app = Flask(__name__)
-
-# --- XvfbManager 类定义 (从 login.py 复制) ---
-user_data_dir = os.path.join(os.path.expanduser('~'), 'drissionpagedata')
-os.makedirs(user_data_dir, exist_ok=True)
+def _json_default(o):
+    if isinstance(o, VideoRecord):
+        return o.to_dict()
+    return DefaultJSONProvider.default(o)
 
-class XvfbManager:
-    """Xvfb虚拟显示器管理器"""
-
-    def __init__(self, display=':99', screen='0', resolution='1920x1080x24'):
-        self.display = display
-        self.screen = screen
-        self.resolution = resolution
-        self.xvfb_process = None
-
-    def start(self):
-        """启动Xvfb虚拟显示器"""
-        try:
-            # 清理可能存在的Xvfb进程
-            self.cleanup()
-
-            print(f"启动Xvfb虚拟显示器: DISPLAY={self.display}")
-
-            # 启动Xvfb，加上了GLX扩展，这可能是之前成功的关键
-            cmd = ['Xvfb', self.display, '-screen', self.screen, self.resolution, '-ac', '+extension', 'GLX']
-            self.xvfb_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.PIPE
-            )
-
-            # 设置环境变量
-            os.environ['DISPLAY'] = self.display
-
-            # 等待Xvfb启动
-            time.sleep(3)
-
-            # 检查Xvfb是否正常运行
-            if self.xvfb_process.poll() is None:
-                print(f"✅ Xvfb启动成功，DISPLAY={self.display}")
-                return True
-            else:
-                stderr_output = self.xvfb_process.stderr.read().decode()
-                print(f"❌ Xvfb启动失败: {stderr_output}")
-                return False
-
-        except Exception as e:
-            print(f"❌ 启动Xvfb时出错: {e}")
-            return False
-
-    def stop(self):
-        """停止Xvfb"""
-        if self.xvfb_process and self.xvfb_process.poll() is None:
-            print("停止Xvfb进程...")
-            self.xvfb_process.terminate()
-            try:
-                self.xvfb_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.xvfb_process.kill()
-
-    def cleanup(self):
-        """清理残留的Xvfb进程"""
-        try:
-            subprocess.run(['pkill', '-f', f'Xvfb.*{self.display}'],
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL)
-            time.sleep(1)
-        except:
-            pass
-# --- XvfbManager 类定义结束 ---
+class JSONProvider(DefaultJSONProvider):
+    """jsonify 时把 VideoRecord 转换为 dict"""
+    default = staticmethod(_json_default)
 
+app = Flask(__name__)
+app.json = JSONProvider(app)
 
 # --- Configuration for DrissionPage (from video_data_final.py and adjusted for Xvfb) ---
-# 定义一个用于保存浏览器用户资料的目录路径
+# 定义一个用于保存浏览器用户资料的目录路径（login.py 登录后的主资料，不直接给浏览器使用）
 user_data_dir = os.path.join(os.path.expanduser('~'), 'drissionpagedata')
 os.makedirs(user_data_dir, exist_ok=True)
 
-# 创建 ChromiumOptions 实例
-co = ChromiumOptions()
-# 设置浏览器用户资料的保存路径
-co.set_user_data_path(user_data_dir)
-co.set_argument('--no-sandbox')
-co.set_argument('--disable-dev-shm-usage')
-co.set_argument('--disable-gpu')
-co.set_argument('--window-size=1920,1080') # Consistent with login.py's resolution
-co.set_argument('--remote-debugging-port=9222')
-co.set_argument('--accept-lang','zh-CN')
-co.set_argument('--no-first-run')
-co.set_argument('--no-default-browser-check')
-co.set_argument('--disable-default-apps')
-co.set_argument('--disable-popup-blocking')
-co.set_argument('--disable-translate')
-co.set_argument('--disable-background-timer-throttling')
-co.set_argument('--disable-renderer-backgrounding')
-co.set_argument('--disable-backgrounding-occluded-windows')
-co.set_argument('--disable-extensions')
-co.set_user_agent('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-chrome_path = '/usr/bin/google-chrome'
-if os.path.exists(chrome_path):
-    co.set_browser_path(chrome_path)
-# ！！！重要：不设置headless()，让Xvfb处理显示！！！
-# co.headless()
+# 只需要接口返回的 JSON，页面中的图片、视频、字体在网络层直接屏蔽；
+# BLOCK_ALLOWLIST 用逗号分隔，包含其中任一字符串的请求不会被屏蔽
+resource_blocker = ResourceBlocker(
+    profile=os.environ.get('BLOCK_PROFILE', 'media'),
+    allowlist=os.environ.get('BLOCK_ALLOWLIST', '').split(','),
+)
+
+# 每个浏览器实例使用独立的调试端口和独立的用户资料副本，多个浏览器可以同时运行；
+# 副本从去掉缓存的用户资料快照物化到 tmpfs（BROWSER_PROFILE_MODE=hardlink 硬链接写时复制 / copy 全部复制）
+port_allocator = PortAllocator()
+profile_cloner = ProfileCloner(
+    user_data_dir,
+    os.environ.get('BROWSER_PROFILE_ROOT'),
+    mode=os.environ.get('BROWSER_PROFILE_MODE', 'hardlink'),
+)
+profile_cloner.cleanup_stale()
+
+# 登录会话池：SESSION_PROFILES 用逗号分隔多个用户资料目录、Cookie 文件（*.json）或包含它们的目录，
+# 不设置时只使用 user_data_dir。每个新浏览器绑定一个会话，失败或出现验证码过多的会话被隔离
+session_pool = SessionPool(
+    load_sessions(os.environ.get('SESSION_PROFILES', '').split(','), user_data_dir),
+    max_failures=int(os.environ.get('SESSION_MAX_FAILURES', '3')),
+    failure_window=float(os.environ.get('SESSION_FAILURE_WINDOW', '600')),
+    quarantine=float(os.environ.get('SESSION_QUARANTINE', '1800')),
+)
+
+# 定期清理过期快照和登录资料目录中的缓存，PROFILE_PRUNE_INTERVAL 为 0 时不清理
+PROFILE_PRUNE_INTERVAL = float(os.environ.get('PROFILE_PRUNE_INTERVAL', '3600'))
+
+def create_chrome_options(port, profile_dir, display):
+    """创建使用指定调试端口、用户资料目录和 Xvfb 显示器的 ChromiumOptions"""
+    co = ChromiumOptions()
+    # 设置浏览器用户资料的保存路径
+    co.set_user_data_path(profile_dir)
+    co.set_local_port(port)
+    # 显示器通过参数传给这个浏览器，而不是修改全局 DISPLAY 环境变量
+    co.set_argument('--display', display)
+    co.set_argument('--no-sandbox')
+    co.set_argument('--disable-dev-shm-usage')
+    co.set_argument('--disable-gpu')
+    co.set_argument('--window-size=1920,1080') # Consistent with login.py's resolution
+    co.set_argument('--accept-lang','zh-CN')
+    co.set_argument('--no-first-run')
+    co.set_argument('--no-default-browser-check')
+    co.set_argument('--disable-default-apps')
+    co.set_argument('--disable-popup-blocking')
+    co.set_argument('--disable-translate')
+    co.set_argument('--disable-background-timer-throttling')
+    co.set_argument('--disable-renderer-backgrounding')
+    co.set_argument('--disable-backgrounding-occluded-windows')
+    co.set_argument('--disable-extensions')
+    if resource_blocker.enabled:
+        # 不需要播放视频，禁止自动播放并静音，减少媒体请求
+        co.set_argument('--autoplay-policy', 'user-gesture-required')
+        co.set_argument('--mute-audio')
+    co.set_user_agent('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    chrome_path = '/usr/bin/google-chrome'
+    if os.path.exists(chrome_path):
+        co.set_browser_path(chrome_path)
+    # ！！！重要：不设置headless()，让Xvfb处理显示！！！
+    # co.headless()
+    return co
+
+def allocate_browser_options():
+    """为新浏览器选择登录会话，分配端口、显示器、复制该会话的用户资料并生成启动配置"""
+    session = session_pool.checkout()
+    display = port = profile_dir = None
+    try:
+        # 显示器池未启动（例如由 WSGI 服务器加载、没有执行 __main__）时这里会抛出异常，先于其他资源申请
+        display = display_pool.acquire()
+        port = port_allocator.allocate()
+        profile_dir = profile_cloner.clone(session.profile_dir) if session.profile_dir else profile_cloner.create_empty()
+    except Exception:
+        if profile_dir:
+            profile_cloner.remove(profile_dir)
+        if port is not None:
+            port_allocator.release(port)
+        if display:
+            display_pool.release(display)
+        session_pool.release(session=session)
+        raise
+    print(f"分配浏览器资源: 会话={session.name}, 端口={port}, 显示器={display}, 用户资料={profile_dir}")
+    options = create_chrome_options(port, profile_dir, display)
+    session_pool.bind(options.address, session)
+    return options
+
+def release_browser_options(options):
+    """浏览器关闭后解除会话绑定，归还端口、显示器并删除复制的用户资料"""
+    session_pool.release(options.address)
+    port = int(options.address.rsplit(':', 1)[-1])
+    port_allocator.release(port)
+    for argument in options.arguments:
+        if argument.startswith('--display='):
+            display_pool.release(argument.split('=', 1)[1])
+    profile_cloner.remove(options.user_data_path)
+
+def setup_browser(page):
+    """新浏览器启动后：设置资源屏蔽，Cookie 会话写入 Cookie"""
+    resource_blocker.apply(page)
+    session_pool.apply_cookies(page)
 # --- End DrissionPage Configuration ---
 
 
+# 抖音站点地址，基准测试时指向本地的模拟服务器（bench/fake_douyin.py）
+DOUYIN_BASE_URL = os.environ.get('DOUYIN_BASE_URL', 'https://www.douyin.com').rstrip('/')
+
+# --- Browser Pool ---
+# 预启动的浏览器池，请求从池中借出浏览器，避免每次请求冷启动 Chrome
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', '2'))
+BROWSER_MAX_USES = int(os.environ.get('BROWSER_MAX_USES', '50'))
+BROWSER_WARMUP_URL = os.environ.get('BROWSER_WARMUP_URL', f'{DOUYIN_BASE_URL}/')
+
+browser_pool = BrowserPool(
+    allocate_browser_options,
+    size=BROWSER_POOL_SIZE,
+    max_uses=BROWSER_MAX_USES,
+    warmup_url=BROWSER_WARMUP_URL,
+    on_dispose=release_browser_options,
+    on_launch=setup_browser,
+    should_retire=session_pool.should_retire,
+)
+# --- End Browser Pool ---
+
+# 视频下载地址缓存，设置 VIDEO_CACHE_DB 后持久化到磁盘
+video_url_cache = VideoUrlCache(
+    max_entries=int(os.environ.get('VIDEO_CACHE_SIZE', '1000')),
+    ttl=int(os.environ.get('VIDEO_CACHE_TTL', '3600')),
+    db_path=os.environ.get('VIDEO_CACHE_DB'),
+)
+
+# 每个主页上次采集的游标和视频集合，用于增量采集
+profile_state_store = ProfileStateStore(
+    os.environ.get('PROFILE_STATE_DIR', os.path.join(os.path.expanduser('~'), 'douyindata_state'))
+)
+
+# 所有采集到的视频和每次采集时的统计快照，VIDEO_STORE_DB 设为空时不保存
+VIDEO_STORE_DB = os.environ.get('VIDEO_STORE_DB', os.path.join(profile_state_store.state_dir, 'videos.db'))
+video_store = VideoStore(VIDEO_STORE_DB) if VIDEO_STORE_DB else None
+
+# 主页翻页方式：api 按接口游标直接请求下一页，scroll 滚动页面触发加载
+PROFILE_PAGING = os.environ.get('PROFILE_PAGING', 'api')
+
+# 设置 PACKET_CAPTURE_DIR 后录制监听到的接口响应，可用 packet_archive.py 离线回放
+packet_capture = PacketCapture(os.environ.get('PACKET_CAPTURE_DIR'))
+
+# 按域名限速：所有浏览器的页面跳转和页面内接口请求共享令牌桶，检测到限流时指数退避、之后逐步恢复；
+# RATE_LIMIT_RPS 设为 0 关闭，设置 RATE_LIMIT_DIR 后同一台机器上的多个服务进程共享限额
+rate_limiter = HostRateLimiter(
+    rate=float(os.environ.get('RATE_LIMIT_RPS', '2')),
+    burst=int(os.environ.get('RATE_LIMIT_BURST', '4')),
+    state_dir=os.environ.get('RATE_LIMIT_DIR') or None,
+    timeout=float(os.environ.get('RATE_LIMIT_TIMEOUT', '120')),
+)
+
+# 短链解析器，复用 HTTP 连接池
+short_link_resolver = ShortLinkResolver(
+    user_agent='Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    rate_limiter=rate_limiter,
+)
+
+
 # --- Xvfb Manager Initialization and Lifecycle Functions ---
-xvfb_manager = None
+# Xvfb 显示器池，多个有界面的浏览器分散到不同显示器上
+display_pool = DisplayPool(size=int(os.environ.get('XVFB_DISPLAYS', '1')))
 
 def start_xvfb_for_app():
-    """Starts Xvfb when the application initializes."""
-    global xvfb_manager
+    """Starts the Xvfb display pool when the application initializes."""
     print("Initializing Xvfb for app...")
-    xvfb_manager = XvfbManager()
-    if not xvfb_manager.start():
+    if not display_pool.start():
         print("❌ Xvfb failed to start. Exiting application.")
         sys.exit(1)
     print("✅ Xvfb started successfully for app.")
 
 def stop_xvfb_for_app(signum=None, frame=None):
     """Stops Xvfb gracefully."""
-    global xvfb_manager
-    if xvfb_manager:
-        print("Stopping Xvfb for app...")
-        xvfb_manager.stop()
-        print("✅ Xvfb stopped for app.")
+    crawl_scheduler.stop()
+    video_downloader.close()
+    media_downloader.close()
+    browser_pool.close()
+    if video_store:
+        video_store.close()
+    profile_cloner.cleanup()
+    print("Stopping Xvfb for app...")
+    display_pool.stop()
+    print("✅ Xvfb stopped for app.")
     sys.exit(0) # Exit the application after stopping Xvfb
 
 
@@ -142,229 +239,853 @@ signal.signal(signal.SIGTERM, stop_xvfb_for_app) # Handle termination signals
 # --- End Xvfb Manager Initialization and Lifecycle Functions ---
 
 
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/get_video_url', methods=['GET'])
-def get_single_video_url():
-    """
-    处理获取单个抖音视频下载链接的请求。
-    此函数直接来自原始的 app.py。
-    参数：url (单个视频链接)
-    """
-    url = request.args.get('url')
-    if not url:
-        return jsonify({'error': 'Missing url parameter'}), 400
-
-    url = url.strip()
+@app.before_request
+def _begin_request_metrics():
+    begin_request(request.endpoint or 'unknown')
 
-    browser = None
-    try:
-       
-        print("已配置浏览器参数：--no-sandbox, --disable-dev-shm-usage, --disable-gpu")
+@app.after_request
+def _count_request(response):
+    REQUESTS_TOTAL.inc(endpoint=request.endpoint or 'unknown', status=response.status_code)
+    return response
 
-        print("正在创建浏览器实例...")
-        # Now ChromiumPage will use the options configured with Xvfb
-        browser = ChromiumPage(co)
-        print("浏览器实例创建成功")
+def _timing_requested():
+    return request.args.get('timing') in ('1', 'true')
 
-        print(f"原始输入URL (处理后): {url}")
-        browser.get(url)
+@app.route('/')
+def index():
+    return render_template('index.html')
 
-        current_url = browser.url
-        print(f"重定向后的URL: {current_url}")
+DETAIL_API = r'/aweme/v1/web/aweme/detail/'
+DETAIL_WAIT_TIMEOUT = int(os.environ.get('DETAIL_WAIT_TIMEOUT', '30'))
+BATCH_MAX_URLS = int(os.environ.get('BATCH_MAX_URLS', '500'))
+BATCH_TAB_CONCURRENCY = int(os.environ.get('BATCH_TAB_CONCURRENCY', '4'))
 
-        video_id = None
-        parsed_url = urlparse(current_url)
-        query_params = parse_qs(parsed_url.query)
+def resolve_video_id_in_browser(page, url):
+    """HTTP 解析失败时，让浏览器跟随跳转后从最终地址中提取视频ID"""
+    print("HTTP 解析失败，回退到浏览器跳转")
+    rate_limiter.acquire(find_url(url))
+    with timed('redirect'):
+        page.get(find_url(url))
 
-        if 'vid' in query_params and query_params['vid']:
-            video_id = query_params['vid'][0]
-            print(f"提取到视频ID: {video_id}")
-        elif 'video' in parsed_url.path:
-            path_parts = parsed_url.path.split('/')
-            if len(path_parts) > 2 and path_parts[-2] == 'video':
-                video_id = path_parts[-1]
-                print(f"从路径中提取到视频ID: {video_id}")
+    current_url = page.url
+    print(f"重定向后的URL: {current_url}")
 
-        if not video_id:
-            raise Exception(f"无法从抖音链接中提取到视频ID。当前URL: {current_url}")
+    video_id = extract_video_id(current_url)
+    if not video_id:
+        raise Exception(f"无法从抖音链接中提取到视频ID。当前URL: {current_url}")
+    print(f"提取到视频ID: {video_id}")
+    return video_id
 
-        detail_url = f"https://www.douyin.com/video/{video_id}"
-        print(f"构造详情页URL: {detail_url}")
+def fetch_detail_video_url(page, video_id):
+    """在浏览器页面（或标签页）中打开详情页，监听 aweme/detail 接口获取播放地址"""
+    detail_url = f"{DOUYIN_BASE_URL}/video/{video_id}"
+    print(f"构造详情页URL: {detail_url}")
 
-        print("开始监听网络请求...")
-        browser.listen.start(r'/aweme/v1/web/aweme/detail/')
-        print("网络监听已启动")
+    print("开始监听网络请求...")
+    page.listen.start(DETAIL_API)
+    print("网络监听已启动")
 
+    try:
         print(f"正在访问详情页: {detail_url}")
-        browser.get(detail_url)
+        rate_limiter.acquire(detail_url)
+        with timed('navigation'):
+            page.get(detail_url)
         print("详情页访问完成，等待API响应...")
 
-        resp = browser.listen.wait()
+        with timed('packet_wait'):
+            resp = page.listen.wait(timeout=DETAIL_WAIT_TIMEOUT)
+        if not resp:
+            verification = is_verification_page(page)
+            if verification:
+                rate_limiter.report(detail_url, True)
+            session_pool.report(page, False, verification, error='等待视频详情接口响应超时')
+            raise Exception("等待视频详情接口响应超时。")
+        json_data = load_body(resp)
+        packet_capture.record(KIND_DETAIL, resp)
+        throttled = is_throttled_packet(resp, json_data)
+        rate_limiter.report(resp.url, throttled)
+        session_pool.report(page, not throttled, error='详情接口被限流或要求验证')
+    finally:
+        page.listen.stop()
 
-        json_data = resp.response.body
+    with timed('extraction'):
+        video_url = parse_detail_video_url(json_data)
+    video_url_cache.put(video_id, video_url)
+    print(f"成功获取视频URL: {video_url}")
+    return video_url
 
-        aweme_detail = json_data.get('aweme_detail')
-        video_info = aweme_detail.get('video', {})
-        play_addr = video_info.get('play_addr', {})
-        url_list = play_addr.get('url_list', [])
+def fetch_video_url(url, use_cache=True, checkout_timeout=None):
+    """
+    解析单个抖音视频链接，返回 (video_id, video_url, cached)。
+    use_cache 为 False 时跳过缓存读取，但仍会用新结果刷新缓存；
+    checkout_timeout 为等待浏览器的秒数（None 使用浏览器池默认值，0 一直等待）。
+    """
+    # 先用普通 HTTP 请求解析短链，标准详情页链接直接提取ID，省去一次浏览器页面加载
+    print(f"原始输入URL (处理后): {url}")
+    with timed('resolve'):
+        video_id = short_link_resolver.resolve(url)
+    if video_id:
+        print(f"提取到视频ID: {video_id}")
+        cached_url = video_url_cache.get(video_id) if use_cache else None
+        if cached_url:
+            print(f"命中缓存: {video_id}")
+            return video_id, cached_url, True
+
+    print("正在从浏览器池获取实例...")
+    with browser_pool.acquire(checkout_timeout) as browser:
+        print("浏览器实例获取成功")
 
-        if not url_list:
-            raise Exception("未找到视频播放地址 (url_list)。")
+        if not video_id:
+            video_id = resolve_video_id_in_browser(browser, url)
+            cached_url = video_url_cache.get(video_id) if use_cache else None
+            if cached_url:
+                print(f"命中缓存: {video_id}")
+                return video_id, cached_url, True
 
-        video_url = ''
-        if len(url_list) > 2:
-            video_url = url_list[2].replace('playwm', 'play')
-        elif len(url_list) > 0:
-            video_url = url_list[0].replace('playwm', 'play')
+        video_url = fetch_detail_video_url(browser, video_id)
+    return video_id, video_url, False
 
-        if not video_url:
-            raise Exception("无法获取有效的视频播放地址。")
+@app.route('/get_video_url', methods=['GET'])
+def get_single_video_url():
+    """
+    处理获取单个抖音视频下载链接的请求。
+    此函数直接来自原始的 app.py。
+    参数：url (单个视频链接)，nocache=1 时跳过缓存重新解析，timing=1 时返回各阶段耗时
+    """
+    url = request.args.get('url')
+    if not url:
+        return jsonify({'error': 'Missing url parameter'}), 400
+
+    url = url.strip()
+    use_cache = request.args.get('nocache') not in ('1', 'true')
 
-        print(f"成功获取视频URL: {video_url}")
-        return jsonify({'video_url': video_url})
+    try:
+        video_id, video_url, cached = fetch_video_url(url, use_cache=use_cache)
+        result = {'video_url': video_url, 'video_id': video_id, 'cached': cached}
+        if _timing_requested():
+            result['timing'] = current_timings()
+        return jsonify(result)
 
     except Exception as e:
         error_msg = str(e)
         print(f"解析过程中出错: {error_msg}")
         return jsonify({'error': f'解析失败: {error_msg}'}), 500
 
-    finally:
-        if browser:
-            try:
-                print("正在关闭浏览器...")
-                browser.quit()
-                print("浏览器已关闭")
-            except Exception as close_error:
-                print(f"关闭浏览器时出错: {close_error}")
-                pass
+@app.route('/get_video_urls', methods=['POST'])
+def get_video_urls():
+    """
+    批量获取视频下载链接。
+    请求体：{"urls": [...], "concurrency": 4, "nocache": false}
+    相同视频只解析一次，未命中缓存的视频在同一个浏览器的多个标签页中并发解析。
+    """
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls')
+    if not isinstance(urls, list) or not urls or not all(isinstance(u, str) for u in urls):
+        return jsonify({'error': 'urls must be a non-empty list of strings'}), 400
+    if len(urls) > BATCH_MAX_URLS:
+        return jsonify({'error': f'at most {BATCH_MAX_URLS} urls per request'}), 400
+
+    urls = [u.strip() for u in urls]
+    use_cache = not data.get('nocache')
+    try:
+        concurrency = int(data.get('concurrency', BATCH_TAB_CONCURRENCY))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'concurrency must be an integer'}), 400
+    concurrency = max(1, min(concurrency, BATCH_TAB_CONCURRENCY))
+    results = [{'url': u} for u in urls]
+
+    # 1. 并发通过 HTTP 解析视频ID
+    with timed('resolve'), ThreadPoolExecutor(max_workers=min(8, len(urls))) as executor:
+        video_ids = list(executor.map(short_link_resolver.resolve, urls))
+
+    # 2. 按视频ID去重并查缓存，剩下的才需要浏览器
+    pending_ids = {}     # video_id -> 对应的结果下标
+    unresolved_urls = {} # HTTP 解析失败的链接 -> 对应的结果下标
+    for i, video_id in enumerate(video_ids):
+        if not video_id:
+            unresolved_urls.setdefault(urls[i], []).append(i)
+            continue
+        results[i]['video_id'] = video_id
+        cached_url = video_url_cache.get(video_id) if use_cache else None
+        if cached_url:
+            results[i].update(video_url=cached_url, cached=True)
+        else:
+            pending_ids.setdefault(video_id, []).append(i)
+
+    work = [('id', video_id) for video_id in pending_ids] + [('url', url) for url in unresolved_urls]
+    print(f"批量解析: 共 {len(urls)} 个链接，需浏览器解析 {len(work)} 个，标签页并发 {concurrency}")
+
+    def worker(tab, item):
+        kind, value = item
+        if kind == 'url':
+            video_id = resolve_video_id_in_browser(tab, value)
+            cached_url = video_url_cache.get(video_id) if use_cache else None
+            if cached_url:
+                return video_id, cached_url, True
+        else:
+            video_id = value
+        return video_id, fetch_detail_video_url(tab, video_id), False
+
+    # 3. 在同一个浏览器的多个标签页中并发解析
+    if work:
+        try:
+            with browser_pool.acquire() as browser:
+                outcomes = run_in_tabs(browser, work, worker, concurrency, setup=resource_blocker.apply)
+        except Exception as e:
+            print(f"批量解析过程中出错: {e}")
+            outcomes = [(None, e)] * len(work)
+
+        for (kind, value), (outcome, error) in zip(work, outcomes):
+            indexes = pending_ids[value] if kind == 'id' else unresolved_urls[value]
+            for i in indexes:
+                if error is not None:
+                    results[i]['error'] = f'解析失败: {error}'
+                else:
+                    video_id, video_url, cached = outcome
+                    results[i].update(video_id=video_id, video_url=video_url, cached=cached)
+
+    failed = sum(1 for r in results if 'error' in r)
+    return jsonify({
+        'results': results,
+        'total': len(urls),
+        'unique': len({r.get('video_id') or r['url'] for r in results}),
+        'failed': failed,
+    })
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """返回视频下载地址缓存的命中统计"""
+    return jsonify(video_url_cache.stats())
+
+def _stream_record(fmt, record_type, payload):
+    """把一条记录编码为 NDJSON 行或 SSE 事件"""
+    if fmt == 'sse':
+        return f"event: {record_type}\ndata: {json.dumps(payload, ensure_ascii=False, default=_json_default)}\n\n"
+    return json.dumps({'type': record_type, **payload}, ensure_ascii=False, default=_json_default) + '\n'
+
+def _save_profile_state(state):
+    """保存主页采集状态，并把本次采集到的视频和统计快照写入视频数据库"""
+    try:
+        profile_state_store.save(state)
+    except OSError as e:
+        print(f"保存主页采集状态失败: {e}")
+    if video_store:
+        video_store.add(state.key, state.crawled_videos)
+
+def crawl_profile(browser, page_url, state, incremental, summary, paging):
+    """采集主页视频，并把采集结果计入浏览器所绑定登录会话的健康状态"""
+    try:
+        yield from iter_profile_videos(browser, page_url, state, incremental, summary, paging,
+                                       capture=packet_capture, limiter=rate_limiter)
+    except Exception as e:
+        session_pool.report(browser, False, is_verification_page(browser), error=str(e))
+        raise
+    if is_verification_page(browser):
+        session_pool.report(browser, False, True)
+    else:
+        session_pool.report(browser, True)
 
 @app.route('/get_user_videos', methods=['GET'])
 def get_user_videos():
     """
     处理获取抖音用户主页所有视频数据的请求。
     此函数直接来自你提供的 video_data_final.py 的最新版本。
-    参数：pageurl (主页链接)
+    参数：pageurl (主页链接)，mode (full 全量 / incremental 只采集上次之后的新视频)，
+    format (json 默认 / ndjson / sse，后两者每解析出一个视频就立即推送)，
+    paging (api 按 max_cursor 直接请求后续页面，失败时回退滚动 / scroll 只滚动加载)，
+    timing=1 时在结果（或流式输出的汇总记录）中附带各阶段耗时
     """
     page_url = request.args.get('pageurl')
     if not page_url:
         return jsonify({'error': 'Missing pageurl parameter'}), 400
 
-    browser = None
-    all_extracted_videos = []
-
-    try:
-        browser = ChromiumPage(co)
-        browser.listen.start('aweme/v1/web/aweme/post/')
-
-        target_profile_url = page_url
-        browser.get(target_profile_url)
-        print(f"正在访问抖音主页: {browser.url}")
-
-        page_counter = 0
-        should_stop_scrolling = False
-
-        while True:
-            page_counter += 1
-            print(f'\n正在采集第{page_counter}页的数据')
-
-            no_more_element = browser.ele('xpath://*[text()="暂时没有更多了"]', timeout=1)
-            if no_more_element:
-                print("检测到 '暂时没有更多了' 文本。将处理完当前数据后停止滚动。")
-                should_stop_scrolling = True
-
+    mode = request.args.get('mode', 'full')
+    if mode not in ('full', 'incremental'):
+        return jsonify({'error': 'mode must be full or incremental'}), 400
+
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'ndjson', 'sse'):
+        return jsonify({'error': 'format must be json, ndjson or sse'}), 400
+
+    paging = request.args.get('paging', PROFILE_PAGING)
+    if paging not in ('api', 'scroll'):
+        return jsonify({'error': 'paging must be api or scroll'}), 400
+
+    state = profile_state_store.load(page_url)
+    incremental = mode == 'incremental' and bool(state.known_ids)
+    if mode == 'incremental' and not incremental:
+        print("该主页没有历史采集记录，执行全量采集。")
+    summary = CrawlSummary('incremental' if incremental else 'full')
+    with_timing = _timing_requested()
+
+    if fmt != 'json':
+        def generate():
+            # 每个视频解析后立即发送，不等采集结束再组装响应（首个视频的延迟与主页大小无关）；
+            # 但采集状态 state 仍在内存中持有全部视频，采集结束后一次保存，内存占用与 json 格式相同
             try:
-                all_captured_responses = browser.listen.wait(count=9999, timeout=10, fit_count=False)
-
-                if not all_captured_responses:
-                    print("本轮滚动未捕捉到任何新的API响应，可能已到底部或加载失败。")
-                    if should_stop_scrolling:
-                        break
-                    print("未检测到结束文本，但本轮未捕捉到任何新数据包，也未提取到视频，停止采集。")
-                    break
-
-                processed_packets_count = 0
-                total_videos_this_round = 0
-
-                for resp_item in all_captured_responses:
-                    try:
-                        if 'aweme/v1/web/aweme/post/' in resp_item.url:
-                            json_data = resp_item.response.body
-                            processed_packets_count += 1
-
-                            video_data = json_data['aweme_list']
-                            if not video_data:
-                                print(f"数据包 {processed_packets_count} (URL: {resp_item.url}) 中没有 aweme_list 数据。")
-                                continue
-
-                            for index in video_data:
-                                extracted_video = {
-                                    "video_id": index["aweme_id"],
-                                    "video_url": f'https://www.douyin.com/video/{index["aweme_id"]}',
-                                    "video_title": index['desc'],
-                                    "create_time": index['create_time'],
-                                    "video_duration": index['duration'],
-                                    "video_like": index['statistics']['digg_count'],
-                                    "video_comment": index['statistics']['comment_count'],
-                                    "video_collect": index['statistics']['collect_count'],
-                                    "video_share": index['statistics']['share_count'],
-                                    "video_download_url": index['video']['play_addr']['url_list'][2]
-                                }
-                                all_extracted_videos.append(extracted_video)
-                                total_videos_this_round += 1
-                                print(f"提取并打印视频 (数据包 {processed_packets_count}):  {extracted_video['video_title']}")
-
-                    except Exception as e:
-                        print(f"处理数据包 {resp_item.url} 时出错: {e}")
-                        continue
-
-                if total_videos_this_round == 0 and processed_packets_count > 0:
-                    print(f"本轮捕捉到 {processed_packets_count} 个数据包，但未提取到任何视频，可能已到底部。")
-                    if should_stop_scrolling:
-                        break
-                    print("未检测到结束文本，但本轮提取不到视频，停止采集。")
-                    break
-
+                with browser_pool.acquire() as browser:
+                    for video in crawl_profile(browser, page_url, state, incremental, summary, paging):
+                        yield _stream_record(fmt, 'video', {'video': video})
+                _save_profile_state(state)
+                summary_record = summary.to_dict()
+                if with_timing:
+                    summary_record['timing'] = current_timings()
+                yield _stream_record(fmt, 'summary', summary_record)
             except Exception as e:
-                print(f"等待API响应时发生错误或超时: {e}")
-                print("这可能意味着没有更多内容加载，或者网络问题。停止采集。")
-                break
-
-            if should_stop_scrolling:
-                print("已检测到结束文本，不再执行滚动操作，并准备停止采集。")
-                break
+                print(f"采集过程中出错: {e}")
+                yield _stream_record(fmt, 'error', {'error': f'采集失败: {e}', **summary.to_dict()})
 
-            tab = browser.ele('xpath://footer[@class="user-page-footer"]/div[1]')
+        mimetype = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+        return Response(stream_with_context(generate()), mimetype=mimetype,
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-            if tab:
-                browser.scroll.to_see(tab)
-            else:
-                print("未找到用于滚动的目标元素，可能页面结构已改变或已到底部。停止采集。")
-                break
-
-
-        print("\n--- 采集流程结束 ---")
-        return jsonify({'videos': all_extracted_videos})
+    try:
+        with browser_pool.acquire() as browser:
+            all_extracted_videos = list(crawl_profile(browser, page_url, state, incremental, summary, paging))
+        _save_profile_state(state)
+
+        if incremental:
+            merged_videos = state.videos
+            print(f"增量采集到 {len(all_extracted_videos)} 个新视频，合并后共 {len(merged_videos)} 个")
+            result = {
+                'videos': merged_videos,
+                'new_videos': len(all_extracted_videos),
+                'mode': 'incremental',
+            }
+        else:
+            result = {'videos': all_extracted_videos}
+        result['duplicates_dropped'] = summary.duplicates_dropped
+        if with_timing:
+            result['timing'] = current_timings()
+        return jsonify(result)
 
     except Exception as e:
         error_msg = str(e)
         print(f"采集过程中出错: {error_msg}")
         return jsonify({'error': f'采集失败: {error_msg}'}), 500
 
-    finally:
-        if browser:
-            try:
-                print("正在关闭浏览器...")
-                browser.quit()
-                print("浏览器已关闭")
-            except Exception as close_error:
-                print(f"关闭浏览器时出错: {close_error}")
-                pass
+@app.route('/export_user_videos', methods=['GET'])
+def export_user_videos():
+    """
+    导出主页上次采集到的全部视频（在服务端生成文件，不再由浏览器拼接 JSON）。
+    参数：pageurl，format (csv 默认 / ndjson 为 gzip 压缩的 NDJSON / parquet / arrow，后两者需要 pyarrow)
+    """
+    page_url = request.args.get('pageurl')
+    if not page_url:
+        return jsonify({'error': 'Missing pageurl parameter'}), 400
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+
+    state = profile_state_store.load(page_url)
+    videos = state.videos
+    if not videos:
+        return jsonify({'error': '该主页还没有采集过视频，请先调用 /get_user_videos'}), 404
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    headers = {'Content-Disposition': f'attachment; filename="douyin_{state.key}.{extension}"'}
+    try:
+        if fmt == 'csv':
+            body = iter_csv(videos)
+        elif fmt == 'ndjson':
+            body = iter_ndjson_gz(videos)
+        elif fmt == 'parquet':
+            body = export_parquet(videos)
+        else:
+            body = export_arrow(videos)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 501
+    return Response(body, mimetype=mimetype, headers=headers)
+
+def _store_required():
+    if not video_store:
+        return jsonify({'error': '视频数据库未启用（VIDEO_STORE_DB 为空）'}), 503
+    return None
+
+def _requested_profile():
+    """查询参数中的主页：profile（sec_uid）或 pageurl"""
+    if request.args.get('profile'):
+        return request.args['profile']
+    if request.args.get('pageurl'):
+        return profile_key(request.args['pageurl'])
+    return None
+
+@app.route('/profile_videos', methods=['GET'])
+def profile_videos():
+    """
+    从视频数据库读取主页视频，不启动浏览器。
+    参数：profile (sec_uid) 或 pageurl，limit (默认 100)，offset
+    """
+    error = _store_required()
+    if error:
+        return error
+    profile = _requested_profile()
+    if not profile:
+        return jsonify({'error': 'Missing profile or pageurl parameter'}), 400
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    return jsonify({'profile': profile, 'videos': video_store.profile_videos(profile, limit, offset)})
+
+@app.route('/profile_history', methods=['GET'])
+def profile_history():
+    """
+    主页每次采集时的视频数与点赞、评论、收藏、分享合计。
+    参数：profile 或 pageurl，since / until (Unix 时间戳)；指定 aweme_id 时返回单个视频的快照
+    """
+    error = _store_required()
+    if error:
+        return error
+    aweme_id = request.args.get('aweme_id')
+    if aweme_id:
+        return jsonify({'aweme_id': aweme_id, 'history': video_store.video_history(aweme_id)})
+    profile = _requested_profile()
+    if not profile:
+        return jsonify({'error': 'Missing profile, pageurl or aweme_id parameter'}), 400
+    history = video_store.profile_history(
+        profile, request.args.get('since', type=float), request.args.get('until', type=float),
+    )
+    return jsonify({'profile': profile, 'history': history})
+
+@app.route('/top_videos', methods=['GET'])
+def top_videos():
+    """
+    按指标排序的前 N 个视频。
+    参数：metric (like 默认 / comment / collect / share / create_time)，n (默认 10)，
+    profile 或 pageurl（不指定时在全部视频中排序）
+    """
+    error = _store_required()
+    if error:
+        return error
+    metric = request.args.get('metric', 'like')
+    if metric not in METRICS:
+        return jsonify({'error': f'metric must be one of {", ".join(METRICS)}'}), 400
+    n = max(1, min(request.args.get('n', 10, type=int), 1000))
+    profile = _requested_profile()
+    return jsonify({'metric': metric, 'profile': profile, 'videos': video_store.top_videos(metric, n, profile)})
+
+# 已被接受的后台任务等待浏览器的秒数，默认 0 表示一直等到有浏览器可用，不因同步请求占用浏览器而失败
+JOB_CHECKOUT_TIMEOUT = float(os.environ.get('JOB_CHECKOUT_TIMEOUT', '0'))
+
+def run_video_job(job):
+    """后台任务：解析单个视频链接"""
+    begin_request('job_video')
+    video_id, video_url, cached = fetch_video_url(job.params['url'], checkout_timeout=JOB_CHECKOUT_TIMEOUT)
+    job.add_result({'video_id': video_id, 'video_url': video_url, 'cached': cached})
+
+def run_profile_job(job):
+    """后台任务：采集主页视频，每解析出一个视频就写入任务结果（定时采集只记录进度，不保留结果）"""
+    begin_request('job_profile')
+    page_url = job.params['pageurl']
+    state = profile_state_store.load(page_url)
+    incremental = job.params.get('mode') == 'incremental' and bool(state.known_ids)
+    summary = CrawlSummary('incremental' if incremental else 'full')
+    collect_results = not job.params.get('scheduled')
+    with browser_pool.acquire(JOB_CHECKOUT_TIMEOUT) as browser:
+        for video in crawl_profile(browser, page_url, state, incremental, summary,
+                                   job.params.get('paging', PROFILE_PAGING)):
+            if collect_results:
+                job.add_result(video)
+            job.set_progress(**summary.to_dict())
+    job.set_progress(**summary.to_dict())
+    _save_profile_state(state)
+
+# 后台任务数量与浏览器池大小一致，队列满时拒绝新任务
+job_manager = JobManager(
+    {'video': run_video_job, 'profile': run_profile_job},
+    workers=BROWSER_POOL_SIZE,
+    max_queue=int(os.environ.get('JOB_QUEUE_SIZE', '100')),
+)
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    提交后台任务，立即返回任务ID。
+    请求体：{"type": "video", "url": ...} 或
+           {"type": "profile", "pageurl": ..., "mode": "full|incremental", "paging": "api|scroll"}
+    """
+    data = request.get_json(silent=True) or {}
+    kind = data.get('type')
+    if kind == 'video':
+        if not data.get('url'):
+            return jsonify({'error': 'Missing url parameter'}), 400
+        if not isinstance(data['url'], str):
+            return jsonify({'error': 'url must be a string'}), 400
+        params = {'url': data['url'].strip()}
+    elif kind == 'profile':
+        if not data.get('pageurl'):
+            return jsonify({'error': 'Missing pageurl parameter'}), 400
+        if not isinstance(data['pageurl'], str):
+            return jsonify({'error': 'pageurl must be a string'}), 400
+        mode = data.get('mode', 'full')
+        if mode not in ('full', 'incremental'):
+            return jsonify({'error': 'mode must be full or incremental'}), 400
+        paging = data.get('paging', PROFILE_PAGING)
+        if paging not in ('api', 'scroll'):
+            return jsonify({'error': 'paging must be api or scroll'}), 400
+        params = {'pageurl': data['pageurl'].strip(), 'mode': mode, 'paging': paging}
+    else:
+        return jsonify({'error': 'type must be video or profile'}), 400
+
+    try:
+        job = job_manager.submit(kind, params)
+    except JobQueueFull:
+        return jsonify({'error': '任务队列已满，请稍后重试'}), 429, {'Retry-After': '30'}
+
+    return jsonify(job.to_dict()), 202, {'Location': f'/jobs/{job.id}'}
+
+# 定时重新采集监控列表中的主页；同时进行的采集至少给 /get_video_url 等交互请求留出一个浏览器
+# （浏览器池只有一个浏览器时除外），定时采集不会占满浏览器池让交互请求等到超时
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') not in ('0', 'false')
+SCHEDULER_DEFAULT_INTERVAL = float(os.environ.get('SCHEDULER_DEFAULT_INTERVAL', '3600'))
+SCHEDULER_MAX_CONCURRENT = max(1, min(
+    int(os.environ.get('SCHEDULER_MAX_CONCURRENT', BROWSER_POOL_SIZE)), BROWSER_POOL_SIZE - 1,
+))
+
+def submit_scheduled_crawl(page_url):
+    return job_manager.submit('profile', {
+        'pageurl': page_url, 'mode': 'incremental', 'paging': PROFILE_PAGING, 'scheduled': True,
+    })
+
+crawl_scheduler = CrawlScheduler(
+    submit_scheduled_crawl,
+    Watchlist(os.environ.get('SCHEDULER_DB', os.path.join(profile_state_store.state_dir, 'watchlist.db'))),
+    max_concurrent=SCHEDULER_MAX_CONCURRENT,
+    jitter=float(os.environ.get('SCHEDULER_JITTER', '0.1')),
+    min_interval=float(os.environ.get('SCHEDULER_MIN_INTERVAL', '600')),
+    max_interval=float(os.environ.get('SCHEDULER_MAX_INTERVAL', '86400')),
+)
+
+@app.route('/watchlist', methods=['GET'])
+def get_watchlist():
+    """监控列表及每个主页的下次采集时间、当前间隔"""
+    return jsonify({'entries': crawl_scheduler.entries(), 'stats': crawl_scheduler.stats()})
+
+@app.route('/watchlist', methods=['POST'])
+def add_to_watchlist():
+    """
+    加入或更新监控的主页。
+    请求体：{"pageurl": ..., "interval": 秒, "priority": 整数（越大越先采集）, "adaptive": true}
+    """
+    data = request.get_json(silent=True) or {}
+    page_url = data.get('pageurl') or ''
+    if not isinstance(page_url, str):
+        return jsonify({'error': 'pageurl must be a string'}), 400
+    page_url = page_url.strip()
+    if not page_url:
+        return jsonify({'error': 'Missing pageurl parameter'}), 400
+    try:
+        interval = float(data.get('interval', SCHEDULER_DEFAULT_INTERVAL))
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'interval and priority must be numbers'}), 400
+    if interval <= 0:
+        return jsonify({'error': 'interval must be positive'}), 400
+    entry = crawl_scheduler.watch(page_url, interval, priority, bool(data.get('adaptive', True)))
+    return jsonify(entry)
+
+@app.route('/watchlist/<key>', methods=['DELETE'])
+def remove_from_watchlist(key):
+    if not crawl_scheduler.unwatch(key):
+        return jsonify({'error': 'profile not found'}), 404
+    return jsonify({'removed': key})
+
+@app.route('/sessions', methods=['GET'])
+def get_sessions():
+    """登录会话列表及每个会话的健康状态"""
+    return jsonify({'sessions': session_pool.entries(), 'stats': session_pool.stats()})
+
+@app.route('/sessions/<name>/release', methods=['POST'])
+def release_session(name):
+    """手动解除会话隔离（例如在浏览器中完成验证之后）"""
+    if not session_pool.release_quarantine(name):
+        return jsonify({'error': 'session not found'}), 404
+    return jsonify({'released': name})
+
+# 视频文件下载：按块并发、可断点续传，下载地址过期时用浏览器重新解析
+DOWNLOAD_MAX_BATCH = int(os.environ.get('DOWNLOAD_MAX_BATCH', '1000'))
+
+DOWNLOAD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Referer': f'{DOUYIN_BASE_URL}/',
+}
+
+def refresh_download_url(video_id):
+    return fetch_video_url(f'{DOUYIN_BASE_URL}/video/{video_id}', use_cache=False)[1]
+
+video_downloader = VideoDownloader(
+    os.environ.get('DOWNLOAD_DIR', os.path.join(os.path.expanduser('~'), 'douyindata_downloads')),
+    max_files=int(os.environ.get('DOWNLOAD_MAX_FILES', '4')),
+    max_connections=int(os.environ.get('DOWNLOAD_MAX_CONNECTIONS', '8')),
+    per_host=int(os.environ.get('DOWNLOAD_PER_HOST', '4')),
+    chunk_size=int(os.environ.get('DOWNLOAD_CHUNK_SIZE', str(4 * 1024 * 1024))),
+    headers=DOWNLOAD_HEADERS,
+    url_refresher=refresh_download_url,
+)
+
+def _download_source(video):
+    """
+    视频文件地址。主页采集的视频（带 video_download_url 字段）只能用 video_download_url，
+    它们的 video_url 是作品网页；/get_video_url 返回的视频用 video_url，但不接受作品网页地址。
+    """
+    download_url = video.get('video_download_url')
+    if download_url is not None:
+        return download_url if isinstance(download_url, str) else None
+    url = video.get('video_url')
+    if not url or not isinstance(url, str):
+        return None
+    parsed = urlparse(url)
+    if parsed.hostname and parsed.hostname.endswith('douyin.com') and parsed.path.startswith('/video/'):
+        return None
+    return url
+
+@app.route('/downloads', methods=['POST'])
+def submit_downloads():
+    """
+    把视频文件加入下载队列，立即返回各文件的下载任务。
+    请求体：{"videos": [...]}，元素为 /get_video_url 或 /get_user_videos 返回的视频
+           （使用 video_id 和 video_download_url，/get_video_url 的结果使用 video_url）；
+           或 {"pageurl": ...}，下载该主页上次采集到的全部视频，没有视频文件的作品列在 skipped 中
+    """
+    data = request.get_json(silent=True) or {}
+    if data.get('pageurl'):
+        if not isinstance(data['pageurl'], str):
+            return jsonify({'error': 'pageurl must be a string'}), 400
+        videos = profile_state_store.load(data['pageurl'].strip()).videos
+        if not videos:
+            return jsonify({'error': '该主页还没有采集过视频，请先调用 /get_user_videos'}), 404
+    elif data.get('videos'):
+        if not isinstance(data['videos'], list):
+            return jsonify({'error': 'videos must be a list'}), 400
+        videos = data['videos']
+    else:
+        return jsonify({'error': 'Missing videos or pageurl parameter'}), 400
+    if len(videos) > DOWNLOAD_MAX_BATCH:
+        return jsonify({'error': f'at most {DOWNLOAD_MAX_BATCH} videos per request'}), 400
+
+    from_profile = bool(data.get('pageurl'))
+    items = []
+    skipped = []
+    for video in videos:
+        video_id = video.get('video_id') if hasattr(video, 'get') else None
+        url = _download_source(video) if video_id else None
+        if from_profile and video_id and not url:
+            # 主页上的图文作品等没有视频文件
+            skipped.append(video_id)
+            continue
+        if not video_id or not url or not str(video_id).isdigit():
+            return jsonify({'error': 'each video needs a numeric video_id and a video file url '
+                                     '(video_download_url, or video_url from /get_video_url)'}), 400
+        items.append((str(video_id), url))
+    if not items:
+        return jsonify({'error': '该主页采集到的作品都没有视频文件地址'}), 404
+    tasks = [video_downloader.submit(video_id, url) for video_id, url in items]
+    return jsonify({'downloads': [task.to_dict() for task in tasks], 'skipped': skipped}), 202
+
+@app.route('/downloads', methods=['GET'])
+def get_downloads():
+    """下载任务列表及进度"""
+    return jsonify({'downloads': video_downloader.entries(), 'stats': video_downloader.stats()})
+
+@app.route('/downloads/<video_id>', methods=['GET'])
+def get_download(video_id):
+    task = video_downloader.get(video_id)
+    if not task:
+        return jsonify({'error': 'download not found'}), 404
+    return jsonify(task.to_dict())
+
+# /download/<aweme_id> 经由服务器转发视频文件，最近下载过的文件保存在磁盘 LRU 缓存中直接发送
+MEDIA_CACHE_MAX_BYTES = int(os.environ.get('MEDIA_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+PROXY_BLOCK_SIZE = 256 * 1024
+PROXY_TIMEOUT = float(os.environ.get('PROXY_TIMEOUT', '30'))
+PROXY_PASS_HEADERS = ('Content-Type', 'Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified')
+
+media_cache = MediaCache(
+    os.environ.get('MEDIA_CACHE_DIR', os.path.join(os.path.expanduser('~'), 'douyindata_media_cache')),
+    max_bytes=MEDIA_CACHE_MAX_BYTES,
+)
+
+def _media_cache_filled(task):
+    if task.status == 'done':
+        media_cache.add(task.video_id)
+    media_cache.end_fill(task.video_id)
+
+# 缓存未命中且请求只要文件的一部分（Range）时，在后台把完整文件下载到缓存目录；
+# 与 /downloads 的下载器共用连接名额和连接池，转发的响应同样占用名额，连接数限制对整个服务有效
+media_downloader = VideoDownloader(
+    media_cache.cache_dir,
+    max_files=2,
+    url_refresher=refresh_download_url,
+    on_finish=_media_cache_filled,
+    limiter=video_downloader.limiter,
+    session=video_downloader.session,
+)
+
+def _source_url(aweme_id):
+    """视频的下载地址：先查地址缓存和视频数据库，都没有时用浏览器解析"""
+    url = video_url_cache.get(aweme_id)
+    if not url and video_store:
+        url = video_store.download_url(aweme_id)
+    return url or refresh_download_url(aweme_id)
+
+def _open_upstream(aweme_id, range_header):
+    """
+    向 CDN 发起流式请求，地址过期时重新解析一次。
+    返回 (地址, 响应, 释放函数)：响应关闭前一直占用一个连接名额，关闭后调用释放函数
+    """
+    url = _source_url(aweme_id)
+    headers = {'Accept-Encoding': 'identity'}
+    if range_header:
+        headers['Range'] = range_header
+    for attempt in range(2):
+        release = video_downloader.limiter.acquire(url, timeout=PROXY_TIMEOUT)
+        try:
+            upstream = video_downloader.session.get(url, headers=headers, stream=True, timeout=PROXY_TIMEOUT)
+        except Exception:
+            release()
+            raise
+        if upstream.status_code not in EXPIRED_STATUS_CODES or attempt:
+            return url, upstream, release
+        upstream.close()
+        release()
+        print(f"下载地址已过期，重新获取: {aweme_id}")
+        url = refresh_download_url(aweme_id)
+
+@app.route('/download/<aweme_id>', methods=['GET'])
+def download_video(aweme_id):
+    """
+    通过服务器下载视频文件，支持 Range 请求（断点续传、拖动播放）。
+    缓存命中时用 send_file 发送本地文件（在 gunicorn 等支持 wsgi.file_wrapper 的服务器上为 sendfile 零拷贝）；
+    未命中时分块转发 CDN 响应，内存占用与文件大小无关，完整请求同时写入缓存，
+    Range 请求则由后台下载器把完整文件下载到缓存。参数：inline=1 时在浏览器中播放而不是下载
+    """
+    if not aweme_id.isdigit():
+        return jsonify({'error': 'invalid aweme_id'}), 400
+    filename = f'douyin_{aweme_id}.mp4'
+    as_attachment = request.args.get('inline') not in ('1', 'true')
+
+    path = media_cache.get(aweme_id)
+    if path:
+        return send_file(path, mimetype='video/mp4', as_attachment=as_attachment, download_name=filename,
+                         conditional=True, max_age=86400)
+
+    range_header = request.headers.get('Range')
+    try:
+        with timed('upstream'):
+            url, upstream, release = _open_upstream(aweme_id, range_header)
+    except ConnectionBusy as e:
+        return jsonify({'error': f'下载连接已满，请稍后重试: {e}'}), 503
+    except Exception as e:
+        print(f"获取视频文件失败: {e}")
+        return jsonify({'error': f'获取视频文件失败: {e}'}), 502
+    if upstream.status_code not in (200, 206):
+        upstream.close()
+        release()
+        return jsonify({'error': f'CDN 返回 HTTP {upstream.status_code}'}), 502
+
+    headers = {name: upstream.headers[name] for name in PROXY_PASS_HEADERS if name in upstream.headers}
+    headers.setdefault('Content-Type', 'video/mp4')
+    disposition = 'attachment' if as_attachment else 'inline'
+    headers['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+
+    fill = media_cache.begin_fill(aweme_id)
+    if fill and upstream.status_code == 206:
+        media_downloader.submit(aweme_id, url)  # 完成后由 _media_cache_filled 登记并结束写入
+        fill = False
+
+    def generate():
+        temp_path = media_cache.temp_path(aweme_id) if fill else None
+        f = open(temp_path, 'wb') if temp_path else None
+        complete = False
+        try:
+            for block in upstream.iter_content(PROXY_BLOCK_SIZE):
+                if f:
+                    f.write(block)
+                yield block
+            complete = True
+        finally:
+            upstream.close()
+            release()
+            if f:
+                f.close()
+                expected = upstream.headers.get('Content-Length')
+                if complete and (expected is None or os.path.getsize(temp_path) == int(expected)):
+                    media_cache.commit(aweme_id, temp_path)
+                else:
+                    # 客户端中途断开或大小不符，不写入缓存
+                    os.remove(temp_path)
+
+    def finished():
+        # 响应体没有被读取（如 HEAD 请求、客户端提前断开）时生成器不会执行，在这里释放
+        upstream.close()
+        release()
+        if fill:
+            media_cache.end_fill(aweme_id)
+
+    response = Response(generate(), status=upstream.status_code, headers=headers)
+    response.call_on_close(finished)
+    return response
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询任务状态、进度和结果，offset 指定从第几条结果开始返回"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'job not found'}), 404
+    offset = request.args.get('offset', 0, type=int)
+    return jsonify(job.to_dict(offset=max(0, offset)))
+
+# 浏览器池、任务队列、缓存的当前状态
+REGISTRY.register(Gauge(
+    'douyin_browser_pool', '浏览器池状态', lambda: {(k,): v for k, v in browser_pool.stats().items()}, ('state',),
+))
+REGISTRY.register(Gauge(
+    'douyin_job_queue', '后台任务队列状态', lambda: {(k,): v for k, v in job_manager.stats().items()}, ('state',),
+))
+REGISTRY.register(Gauge(
+    'douyin_video_cache', '视频下载地址缓存状态', lambda: {(k,): v for k, v in video_url_cache.stats().items()}, ('state',),
+))
+REGISTRY.register(Gauge(
+    'douyin_scheduler', '定时采集状态', lambda: {(k,): v for k, v in crawl_scheduler.stats().items()}, ('state',),
+))
+if video_store:
+    REGISTRY.register(Gauge(
+        'douyin_video_store', '视频数据库写入状态', lambda: {(k,): v for k, v in video_store.stats().items()}, ('state',),
+    ))
+REGISTRY.register(Gauge(
+    'douyin_rate_limit_factor', '各域名当前的限速系数（1 为正常速度）',
+    lambda: {(host,): factor for host, factor in rate_limiter.stats().items()}, ('host',),
+))
+REGISTRY.register(Gauge(
+    'douyin_sessions', '登录会话状态', lambda: {(k,): v for k, v in session_pool.stats().items()}, ('state',),
+))
+REGISTRY.register(Gauge(
+    'douyin_profile_files', '物化用户资料副本时硬链接 / 复制的文件数',
+    lambda: {(k,): v for k, v in profile_cloner.stats().items()}, ('mode',),
+))
+REGISTRY.register(Gauge(
+    'douyin_downloads', '视频文件下载状态', lambda: {(k,): v for k, v in video_downloader.stats().items()}, ('state',),
+))
+REGISTRY.register(Gauge(
+    'douyin_media_cache', '视频文件磁盘缓存状态', lambda: {(k,): v for k, v in media_cache.stats().items()}, ('state',),
+))
+REGISTRY.register(Gauge(
+    'douyin_blocked_requests', '被资源屏蔽拦截的请求数', lambda: resource_blocker.blocked,
+))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 格式的指标"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     start_xvfb_for_app() # Start Xvfb when the app runs
+    browser_pool.start() # Pre-launch browsers once the display is available
+    job_manager.start() # Start background job workers
+    profile_cloner.start_pruning(
+        PROFILE_PRUNE_INTERVAL, [s.profile_dir for s in session_pool.sessions if s.profile_dir],
+    )
+    if SCHEDULER_ENABLED:
+        crawl_scheduler.start()
 
     # You might want to consider running Flask in a production-ready WSGI server like Gunicorn
     # in a real deployment, rather than directly using app.run()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析阶段的基准测试：对比标准库 json 与 orjson 的解码耗时，以及原来逐层下标取值的提取函数
+与 aweme_schema 编译出的提取函数的耗时。
+
+用法：
+    # 使用录制的数据包（packet_archive.py 的归档）
+    python bench/bench_parser.py capture/
+    # 不指定归档时生成带有大量无关字段的模拟数据包
+    python bench/bench_parser.py --packets 50 --page-size 18 --output bench/results/parser.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import aweme_schema  # noqa: E402
+from fake_douyin import AWEME_ID_BASE, build_aweme  # noqa: E402
+from packet_archive import KIND_POST, iter_archive  # noqa: E402
+
+
+def legacy_extract_video(index):
+    """改为字段表之前的提取方式，作为对比基线"""
+    return {
+        "video_id": index["aweme_id"],
+        "video_url": f'https://www.douyin.com/video/{index["aweme_id"]}',
+        "video_title": index['desc'],
+        "create_time": index['create_time'],
+        "video_duration": index['duration'],
+        "video_like": index['statistics']['digg_count'],
+        "video_comment": index['statistics']['comment_count'],
+        "video_collect": index['statistics']['collect_count'],
+        "video_share": index['statistics']['share_count'],
+        "video_download_url": index['video']['play_addr']['url_list'][2],
+        "is_top": bool(index.get('is_top')),
+    }
+
+
+def _bulky_fields(i):
+    """真实的 aweme 记录中有大量用不到的字段，模拟数据中补上类似体量的内容"""
+    return {
+        'author': {
+            'uid': str(10000 + i), 'nickname': f'作者{i}', 'signature': '签名' * 20,
+            'avatar_thumb': {'url_list': [f'https://p3.douyinpic.com/avatar/{i}.jpeg?x={n}' for n in range(3)]},
+        },
+        'music': {
+            'id': i, 'title': f'原声 {i}', 'author': f'作者{i}',
+            'play_url': {'url_list': [f'https://sf3.douyinvod.com/music/{i}.mp3?x={n}' for n in range(2)]},
+        },
+        'text_extra': [{'hashtag_name': f'话题{n}', 'start': n, 'end': n + 3} for n in range(5)],
+        'video_tag': [{'tag_id': n, 'tag_name': f'标签{n}', 'level': n} for n in range(3)],
+        'bit_rate': [
+            {'gear_name': f'normal_{q}', 'bit_rate': 1000000 + q,
+             'play_addr': {'url_list': [f'https://v3.douyinvod.com/{i}/{q}.mp4?x={n}' for n in range(3)],
+                           'width': 1080, 'height': 1920, 'data_size': 1234567}}
+            for q in range(4)
+        ],
+    }
+
+
+def synthetic_packets(count, page_size):
+    packets = []
+    for page in range(count):
+        aweme_list = []
+        for index in range(page * page_size, (page + 1) * page_size):
+            aweme = build_aweme(AWEME_ID_BASE + index, index, 'https://www.douyin.com')
+            aweme.update(_bulky_fields(index))
+            aweme['video'].update(_bulky_fields(index)['bit_rate'][0])
+            aweme_list.append(aweme)
+        packets.append({'status_code': 0, 'aweme_list': aweme_list, 'max_cursor': page, 'has_more': 1})
+    return packets
+
+
+def load_archived_packets(paths):
+    packets = []
+    for archive in paths:
+        files = sorted(glob.glob(os.path.join(archive, '*.jsonl.gz'))) if os.path.isdir(archive) else [archive]
+        for path in files:
+            for packet in iter_archive(path):
+                if packet.kind == KIND_POST and isinstance(packet.response.body, dict):
+                    packets.append(packet.response.body)
+    return packets
+
+
+def measure(func, items, repeat):
+    """重复执行 repeat 轮，返回最快一轮的耗时（秒）"""
+    best = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        for item in items:
+            func(item)
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='解析阶段基准测试')
+    parser.add_argument('archives', nargs='*', help='录制的归档文件或目录')
+    parser.add_argument('--packets', type=int, default=50, help='模拟数据包数量')
+    parser.add_argument('--page-size', type=int, default=18)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='结果写入的 JSON 文件')
+    args = parser.parse_args()
+
+    packets = load_archived_packets(args.archives) if args.archives else synthetic_packets(args.packets, args.page_size)
+    raw_bodies = [json.dumps(packet, ensure_ascii=False) for packet in packets]
+    awemes = [aweme for packet in packets for aweme in packet.get('aweme_list') or []]
+    total_bytes = sum(len(body.encode('utf-8')) for body in raw_bodies)
+    print(f"数据包 {len(packets)} 个，视频 {len(awemes)} 条，响应体共 {total_bytes / 1024 / 1024:.2f} MB")
+
+    results = {
+        'packets': len(packets),
+        'videos': len(awemes),
+        'body_bytes': total_bytes,
+        'decode_seconds': {'json': measure(json.loads, raw_bodies, args.repeat)},
+        'extract_seconds': {},
+    }
+    if aweme_schema.orjson is not None:
+        results['decode_seconds']['orjson'] = measure(aweme_schema.orjson.loads, raw_bodies, args.repeat)
+    else:
+        print("未安装 orjson，跳过 orjson 解码测试")
+
+    # 原来的提取函数遇到缺失字段会抛出异常，只用能完整提取的记录对比
+    complete = []
+    for aweme in awemes:
+        try:
+            legacy_extract_video(aweme)
+            complete.append(aweme)
+        except (KeyError, IndexError, TypeError):
+            pass
+    results['extract_seconds']['legacy'] = measure(legacy_extract_video, complete, args.repeat)
+    results['extract_seconds']['compiled'] = measure(aweme_schema.extract_video, complete, args.repeat)
+    results['legacy_failures'] = len(awemes) - len(complete)
+
+    for stage, timings in (('解码', results['decode_seconds']), ('提取', results['extract_seconds'])):
+        for name, seconds in timings.items():
+            count = len(raw_bodies) if stage == '解码' else len(complete)
+            per_item = seconds / count * 1e6 if count else 0
+            print(f"  {stage} [{name}]: {seconds * 1000:.2f} ms，平均每条 {per_item:.1f} µs")
+    if results['legacy_failures']:
+        print(f"  原提取函数无法处理的视频: {results['legacy_failures']} 条（新提取函数使用字段默认值）")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
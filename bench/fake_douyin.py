@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟抖音站点，用于离线基准测试。
+
+提供的页面和接口：
+    /                               首页（浏览器池预热用）
+    /user/<sec_uid>                 主页，页面内请求 aweme/post 接口并在滚动到底部时加载下一页
+    /aweme/v1/web/aweme/post/       主页视频列表，按 max_cursor 分页，返回 has_more
+    /video/<aweme_id>               详情页，页面内请求 aweme/detail 接口
+    /aweme/v1/web/aweme/detail/     视频详情
+    /s/<aweme_id>                   短链，经过若干次 302 跳转到详情页
+
+用法：
+    python bench/fake_douyin.py --port 8100 --api-latency 150 --pages 5
+    DOUYIN_BASE_URL=http://127.0.0.1:8100 python app.py
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import time
+import zlib
+
+from flask import Flask, Response, abort, jsonify, redirect, request
+
+AWEME_ID_BASE = 7000000000000000000
+# 第一个视频的发布时间，之后每个视频早一小时
+NEWEST_CREATE_TIME = 1735689600
+
+PROFILE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>模拟主页 {sec_uid}</title>
+<style>.item {{height: 400px; border-bottom: 1px solid #ccc;}}</style></head>
+<body>
+<div id="list"></div>
+<footer class="user-page-footer"><div>加载中</div></footer>
+<script>
+var postUrl = '/aweme/v1/web/aweme/post/?device_platform=webapp&aid=6383&sec_user_id={sec_uid}&count={page_size}&pages={pages}';
+var cursor = 0, hasMore = true, loading = false;
+var footer = document.querySelector('footer div');
+function loadPage() {{
+    if (loading || !hasMore) return;
+    loading = true;
+    fetch(postUrl + '&max_cursor=' + cursor, {{credentials: 'include'}})
+        .then(function (r) {{ return r.json(); }})
+        .then(function (data) {{
+            var list = document.getElementById('list');
+            data.aweme_list.forEach(function (aweme) {{
+                var item = document.createElement('div');
+                item.className = 'item';
+                item.textContent = aweme.desc;
+                list.appendChild(item);
+            }});
+            cursor = data.max_cursor;
+            hasMore = !!data.has_more;
+            if (!hasMore) {{
+                var end = document.createElement('div');
+                end.textContent = '暂时没有更多了';
+                document.body.appendChild(end);
+            }}
+            loading = false;
+            observer.observe(footer);
+        }});
+}}
+var observer = new IntersectionObserver(function (entries) {{
+    if (entries[0].isIntersecting) {{ observer.unobserve(footer); loadPage(); }}
+}});
+loadPage();
+</script>
+</body></html>
+"""
+
+DETAIL_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>模拟详情页 {aweme_id}</title></head>
+<body>
+<div id="desc"></div>
+<script>
+fetch('/aweme/v1/web/aweme/detail/?device_platform=webapp&aid=6383&aweme_id={aweme_id}', {{credentials: 'include'}})
+    .then(function (r) {{ return r.json(); }})
+    .then(function (data) {{ document.getElementById('desc').textContent = data.aweme_detail.desc; }});
+</script>
+</body></html>
+"""
+
+
+class FakeDouyinConfig:
+    """模拟站点的延迟、分页等参数，单位为毫秒的延迟都会叠加 ±jitter 的随机抖动"""
+
+    def __init__(self, pages=5, page_size=18, api_latency=100, page_latency=50,
+                 redirect_latency=20, jitter=0.2, redirect_hops=2, aweme_template=None, media_size=1024):
+        self.pages = pages
+        self.page_size = page_size
+        self.api_latency = api_latency
+        self.page_latency = page_latency
+        self.redirect_latency = redirect_latency
+        self.jitter = jitter
+        self.redirect_hops = redirect_hops
+        # 录制下来的一条真实 aweme 记录，生成数据时以它为模板，只替换 ID、标题和统计数据
+        self.aweme_template = aweme_template
+        # /media 返回的视频文件大小（字节），测试下载器时调大
+        self.media_size = media_size
+
+
+def _profile_offset(sec_uid):
+    """每个主页使用互不重叠的视频ID区间"""
+    return (zlib.crc32(sec_uid.encode()) % 1000000) * 1000
+
+
+def build_aweme(aweme_id, index, base_url, template=None):
+    """生成一条 aweme 记录，字段与 aweme/post、aweme/detail 接口一致"""
+    play_url = f'{base_url}/media/{aweme_id}.mp4'
+    aweme = json.loads(json.dumps(template)) if template else {}
+    aweme.update({
+        'aweme_id': str(aweme_id),
+        'desc': f'模拟视频 #{index}',
+        'create_time': NEWEST_CREATE_TIME - index * 3600,
+        'duration': 15000 + index % 30 * 1000,
+        'is_top': 0,
+        'statistics': {
+            'digg_count': 1000 + index * 7,
+            'comment_count': 100 + index * 3,
+            'collect_count': 50 + index,
+            'share_count': 10 + index % 50,
+        },
+    })
+    video = aweme.setdefault('video', {})
+    video['play_addr'] = {
+        'uri': f'v0200fg10000{aweme_id}',
+        'url_list': [
+            f'{play_url}?source=playwm&cdn=1',
+            f'{play_url}?source=playwm&cdn=2',
+            f'{play_url}?source=playwm&cdn=3',
+        ],
+    }
+    return aweme
+
+
+def create_app(config=None):
+    config = config or FakeDouyinConfig()
+    app = Flask(__name__)
+
+    def delay(milliseconds):
+        if milliseconds > 0:
+            factor = 1 + random.uniform(-config.jitter, config.jitter)
+            time.sleep(milliseconds * factor / 1000)
+
+    def base_url():
+        return request.host_url.rstrip('/')
+
+    @app.route('/')
+    def home():
+        delay(config.page_latency)
+        return '<!DOCTYPE html><html><head><meta charset="utf-8"><title>模拟抖音</title></head><body></body></html>'
+
+    @app.route('/user/<sec_uid>')
+    def profile_page(sec_uid):
+        delay(config.page_latency)
+        pages = request.args.get('pages', type=int) or config.pages
+        return PROFILE_PAGE.format(sec_uid=sec_uid, page_size=config.page_size, pages=pages)
+
+    @app.route('/aweme/v1/web/aweme/post/')
+    def aweme_post():
+        delay(config.api_latency)
+        sec_uid = request.args.get('sec_user_id', '')
+        # max_cursor 就是下一页第一个视频的序号，0 表示第一页
+        cursor = request.args.get('max_cursor', 0, type=int)
+        page_size = request.args.get('count', config.page_size, type=int)
+        total = (request.args.get('pages', type=int) or config.pages) * page_size
+        offset = _profile_offset(sec_uid)
+        end = min(cursor + page_size, total)
+        aweme_list = [
+            build_aweme(AWEME_ID_BASE + offset + index, index, base_url(), config.aweme_template)
+            for index in range(cursor, end)
+        ]
+        return jsonify({
+            'status_code': 0,
+            'aweme_list': aweme_list,
+            'max_cursor': end,
+            'min_cursor': cursor,
+            'has_more': 1 if end < total else 0,
+        })
+
+    @app.route('/video/<aweme_id>')
+    def detail_page(aweme_id):
+        delay(config.page_latency)
+        return DETAIL_PAGE.format(aweme_id=aweme_id)
+
+    @app.route('/aweme/v1/web/aweme/detail/')
+    def aweme_detail():
+        delay(config.api_latency)
+        aweme_id = request.args.get('aweme_id', '')
+        if not aweme_id.isdigit():
+            return jsonify({'status_code': 2053, 'aweme_detail': None})
+        index = int(aweme_id) % 1000
+        return jsonify({
+            'status_code': 0,
+            'aweme_detail': build_aweme(int(aweme_id), index, base_url(), config.aweme_template),
+        })
+
+    @app.route('/s/<aweme_id>')
+    @app.route('/s/<aweme_id>/<int:hop>')
+    def short_link(aweme_id, hop=0):
+        delay(config.redirect_latency)
+        if not aweme_id.isdigit():
+            abort(404)
+        if hop + 1 < config.redirect_hops:
+            return redirect(f'/s/{aweme_id}/{hop + 1}', code=302)
+        return redirect(f'/video/{aweme_id}?previous_page=app_code_link', code=302)
+
+    @app.route('/media/<name>')
+    def media(name):
+        # 资源屏蔽生效时浏览器不会请求这里；内容由文件名决定，支持 Range 请求，可用于测试分块下载
+        seed = hashlib.sha1(name.encode()).digest()
+        body = (seed * (config.media_size // len(seed) + 1))[:config.media_size]
+        response = Response(body, mimetype='video/mp4')
+        response.set_etag(seed.hex())
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(body))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟抖音站点')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--pages', type=int, default=5, help='每个主页的视频页数')
+    parser.add_argument('--page-size', type=int, default=18, help='每页视频数')
+    parser.add_argument('--api-latency', type=float, default=100, help='接口延迟（毫秒）')
+    parser.add_argument('--page-latency', type=float, default=50, help='页面延迟（毫秒）')
+    parser.add_argument('--redirect-latency', type=float, default=20, help='短链每一跳的延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延迟随机抖动比例')
+    parser.add_argument('--redirect-hops', type=int, default=2, help='短链跳转次数')
+    parser.add_argument('--media-size', type=int, default=1024, help='/media 视频文件大小（字节）')
+    parser.add_argument('--aweme-template', help='录制的 aweme 记录（JSON 文件），作为生成数据的模板')
+    args = parser.parse_args()
+
+    template = None
+    if args.aweme_template:
+        with open(args.aweme_template, 'r', encoding='utf-8') as f:
+            template = json.load(f)
+
+    config = FakeDouyinConfig(
+        pages=args.pages, page_size=args.page_size, api_latency=args.api_latency,
+        page_latency=args.page_latency, redirect_latency=args.redirect_latency,
+        jitter=args.jitter, redirect_hops=args.redirect_hops, aweme_template=template,
+        media_size=args.media_size,
+    )
+    create_app(config).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
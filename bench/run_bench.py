@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线基准测试：在本地模拟站点（fake_douyin.py）上压测 /get_video_url 和 /get_user_videos，
+按不同并发统计吞吐量、p50/p95/p99 延迟和进程树（服务 + 浏览器）的峰值内存，结果写入 JSON 文件。
+
+用法：
+    # 自动启动模拟站点和服务
+    python bench/run_bench.py --start-app --concurrency 1,2,4 --requests 20
+    # 压测已经在运行的服务（需设置 DOUYIN_BASE_URL 指向模拟站点），并与上次结果对比
+    python bench/run_bench.py --app-url http://127.0.0.1:8000 --app-pid 12345 --baseline bench/results/old.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_douyin import AWEME_ID_BASE, FakeDouyinConfig, create_app  # noqa: E402
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, 'bench', 'results')
+
+
+def percentile(sorted_values, p):
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(p / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _process_rss(pid):
+    """读取进程当前 RSS（字节），进程已退出时返回 0"""
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _process_tree(root_pid):
+    """root_pid 及其全部子孙进程（Chrome 由服务进程启动，一并统计）"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # comm 字段可能包含空格，从最后一个右括号之后解析
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+class RssSampler:
+    """后台定时采样进程树的总 RSS，记录峰值"""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = 0
+        self._stop.clear()
+        if self.pid:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            total = sum(_process_rss(pid) for pid in _process_tree(self.pid))
+            self.peak = max(self.peak, total)
+            self._stop.wait(self.interval)
+
+
+def start_fake_server(config, port):
+    """在后台线程中启动模拟站点"""
+    server = make_server('127.0.0.1', port, create_app(config), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_app(fake_url, app_url, env_overrides, timeout=180):
+    """启动服务进程并等待其可以响应请求"""
+    state_dir = tempfile.mkdtemp(prefix='bench-state-')
+    env = dict(os.environ)
+    env.update({
+        'DOUYIN_BASE_URL': fake_url,
+        'PROFILE_STATE_DIR': state_dir,
+        'PYTHONUNBUFFERED': '1',
+    })
+    env.update(env_overrides)
+    log = open(os.path.join(state_dir, 'app.log'), 'w')
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    print(f"服务进程已启动 (pid={process.pid})，日志: {log.name}")
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务进程启动失败，退出码 {process.returncode}，详见 {log.name}")
+        try:
+            requests.get(f'{app_url}/cache_stats', timeout=2)
+            return process
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("等待服务启动超时")
+
+
+def stop_app(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _request_once(session, url, params, timeout):
+    started_at = time.perf_counter()
+    try:
+        resp = session.get(url, params=params, timeout=timeout)
+        ok = resp.status_code == 200
+        error = None if ok else f'HTTP {resp.status_code}'
+    except requests.RequestException as e:
+        ok, error = False, str(e)
+    return time.perf_counter() - started_at, ok, error
+
+
+def run_scenario(name, app_url, fake_url, concurrency, count, sampler, timeout, profile_pages):
+    """以指定并发发出 count 个请求，返回统计结果"""
+    if name == 'video':
+        endpoint = f'{app_url}/get_video_url'
+        # 每个请求使用不同的视频ID，并跳过缓存，测量完整的解析流程
+        params_list = [
+            {'url': f'{fake_url}/s/{AWEME_ID_BASE + 900000000 + i}', 'nocache': '1'}
+            for i in range(count)
+        ]
+    else:
+        endpoint = f'{app_url}/get_user_videos'
+        params_list = [
+            {'pageurl': f'{fake_url}/user/BENCH_{concurrency}_{i}?pages={profile_pages}', 'mode': 'full'}
+            for i in range(count)
+        ]
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(concurrency, 10))
+    session.mount('http://', adapter)
+
+    with sampler, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started_at = time.perf_counter()
+        outcomes = list(executor.map(lambda params: _request_once(session, endpoint, params, timeout), params_list))
+        wall_seconds = time.perf_counter() - started_at
+
+    latencies = sorted(elapsed for elapsed, ok, _ in outcomes if ok)
+    errors = [error for _, ok, error in outcomes if not ok]
+    result = {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': count,
+        'ok': len(latencies),
+        'errors': len(errors),
+        'error_samples': errors[:5],
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_rps': round(len(latencies) / wall_seconds, 3) if wall_seconds else None,
+        'latency_ms': {
+            'p50': _ms(percentile(latencies, 50)),
+            'p95': _ms(percentile(latencies, 95)),
+            'p99': _ms(percentile(latencies, 99)),
+            'mean': _ms(sum(latencies) / len(latencies)) if latencies else None,
+            'max': _ms(latencies[-1]) if latencies else None,
+        },
+        'peak_rss_mb': round(sampler.peak / 1024 / 1024, 1) if sampler.pid else None,
+    }
+    print(f"[{name}] 并发={concurrency} 成功={result['ok']}/{count} "
+          f"吞吐={result['throughput_rps']} req/s p50={result['latency_ms']['p50']}ms "
+          f"p95={result['latency_ms']['p95']}ms p99={result['latency_ms']['p99']}ms "
+          f"峰值内存={result['peak_rss_mb']}MB")
+    return result
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    """打印与基线结果相比的吞吐量和 p95 变化"""
+    previous = {(r['scenario'], r['concurrency']): r for r in baseline.get('results', [])}
+    print(f"\n与基线 {baseline.get('git_commit')} ({baseline.get('started_at')}) 对比:")
+    for result in current['results']:
+        old = previous.get((result['scenario'], result['concurrency']))
+        if not old:
+            continue
+        print(f"  [{result['scenario']}] 并发={result['concurrency']} "
+              f"吞吐 {old['throughput_rps']} -> {result['throughput_rps']} req/s, "
+              f"p95 {old['latency_ms']['p95']} -> {result['latency_ms']['p95']} ms, "
+              f"峰值内存 {old['peak_rss_mb']} -> {result['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线基准测试')
+    parser.add_argument('--app-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--app-pid', type=int, help='压测已运行的服务时，用于统计内存的进程ID')
+    parser.add_argument('--start-app', action='store_true', help='自动启动服务进程（需要 Xvfb 和 Chrome）')
+    parser.add_argument('--app-env', action='append', default=[], metavar='KEY=VALUE',
+                        help='启动服务时额外设置的环境变量，可重复')
+    parser.add_argument('--fake-url', help='使用已运行的模拟站点，不指定时自动在 --fake-port 启动')
+    parser.add_argument('--fake-port', type=int, default=8100)
+    parser.add_argument('--scenarios', default='video,profile')
+    parser.add_argument('--concurrency', default='1,2,4')
+    parser.add_argument('--requests', type=int, default=20, help='每个场景、每种并发的请求数')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--profile-pages', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=18)
+    parser.add_argument('--api-latency', type=float, default=100)
+    parser.add_argument('--page-latency', type=float, default=50)
+    parser.add_argument('--output', help='结果文件，默认写入 bench/results/<时间>.json')
+    parser.add_argument('--baseline', help='用于对比的历史结果文件')
+    args = parser.parse_args()
+
+    fake_config = FakeDouyinConfig(
+        pages=args.profile_pages, page_size=args.page_size,
+        api_latency=args.api_latency, page_latency=args.page_latency,
+    )
+    fake_server = None
+    fake_url = args.fake_url
+    if not fake_url:
+        fake_server = start_fake_server(fake_config, args.fake_port)
+        fake_url = f'http://127.0.0.1:{args.fake_port}'
+        print(f"模拟站点已启动: {fake_url}")
+
+    app_process = None
+    app_pid = args.app_pid
+    if args.start_app:
+        app_env = dict(item.split('=', 1) for item in args.app_env)
+        app_process = start_app(fake_url, args.app_url, app_env)
+        app_pid = app_process.pid
+
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+    report = {
+        'started_at': started_at,
+        'git_commit': _git_commit(),
+        'config': {
+            'app_url': args.app_url,
+            'fake_url': fake_url,
+            'requests': args.requests,
+            'profile_pages': args.profile_pages,
+            'page_size': args.page_size,
+            'api_latency_ms': args.api_latency,
+            'page_latency_ms': args.page_latency,
+            'app_env': args.app_env,
+        },
+        'results': [],
+    }
+    try:
+        for name in args.scenarios.split(','):
+            for concurrency in (int(c) for c in args.concurrency.split(',')):
+                report['results'].append(run_scenario(
+                    name, args.app_url, fake_url, concurrency, args.requests,
+                    RssSampler(app_pid), args.timeout, args.profile_pages,
+                ))
+    finally:
+        if app_process:
+            stop_app(app_process)
+        if fake_server:
+            fake_server.shutdown()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{started_at.replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入: {output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
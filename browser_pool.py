@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from DrissionPage import ChromiumPage
+
+from metrics import begin_request, current_endpoint, timed
+
+# 等待空闲浏览器时每隔多少秒重新检查一次是否可以启动新实例
+CHECKOUT_POLL_INTERVAL = 5
+
+
+class PooledBrowser:
+    """浏览器池中的单个浏览器实例"""
+
+    def __init__(self, page, options=None):
+        self.page = page
+        self.options = options
+        self.uses = 0
+        self.created_at = time.time()
+
+
+class BrowserPool:
+    """预启动的浏览器实例池
+
+    请求通过 acquire() 借出一个已经启动好的浏览器，用完后自动归还，
+    避免每个请求都重新启动 Chrome、加载用户资料和抖音首页脚本。
+    """
+
+    def __init__(self, options_factory, size=1, max_uses=50, warmup_url=None, checkout_timeout=60,
+                 on_dispose=None, on_launch=None, should_retire=None):
+        # options_factory: 无参函数，返回用于启动新浏览器的 ChromiumOptions
+        # on_dispose: 浏览器关闭后调用，参数为启动它的 ChromiumOptions，用于释放端口、删除资料目录
+        # on_launch: 新浏览器启动后、预热前调用，参数为页面对象，用于设置资源屏蔽等
+        # should_retire: 归还时调用，参数为页面对象，返回 True 时关闭该浏览器并补充新实例（如登录会话被隔离）
+        self.options_factory = options_factory
+        self.on_dispose = on_dispose
+        self.on_launch = on_launch
+        self.should_retire = should_retire
+        self.size = max(1, int(size))
+        self.max_uses = max(1, int(max_uses))
+        self.warmup_url = warmup_url
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = queue.LifoQueue()  # 后进先出，优先复用最近用过（最"热"）的实例
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+
+    def start(self):
+        """预先启动全部浏览器实例"""
+        print(f"正在预启动 {self.size} 个浏览器实例...")
+        for _ in range(self.size):
+            with self._lock:
+                if self._created >= self.size:
+                    break
+                self._created += 1
+            try:
+                self._idle.put(self._launch())
+            except Exception as e:
+                with self._lock:
+                    self._created -= 1
+                print(f"❌ 预启动浏览器失败: {e}")
+        print(f"✅ 浏览器池就绪，空闲实例: {self._idle.qsize()}")
+
+    def _launch(self):
+        """启动一个新的浏览器实例并进行预热"""
+        options = self.options_factory()
+        try:
+            with timed('browser_launch'):
+                page = ChromiumPage(options)
+        except Exception:
+            self._run_dispose_hook(options)
+            raise
+        try:
+            if self.on_launch:
+                self.on_launch(page)
+            if self.warmup_url:
+                try:
+                    page.get(self.warmup_url)
+                except Exception as e:
+                    print(f"浏览器预热失败（忽略）: {e}")
+        except Exception:
+            # 启动后的设置失败时关闭浏览器并释放端口、资料目录、显示器等资源
+            try:
+                page.quit()
+            except Exception as e:
+                print(f"关闭浏览器时出错: {e}")
+            self._run_dispose_hook(options)
+            raise
+        return PooledBrowser(page, options)
+
+    def _run_dispose_hook(self, options):
+        if self.on_dispose:
+            try:
+                self.on_dispose(options)
+            except Exception as e:
+                print(f"释放浏览器资源时出错: {e}")
+
+    def _is_healthy(self, item):
+        """借出前的健康检查：浏览器进程仍可响应 JS 调用"""
+        try:
+            return item.page.run_js('return document.readyState;', timeout=5) is not None
+        except Exception as e:
+            print(f"浏览器健康检查失败: {e}")
+            return False
+
+    def _dispose(self, item):
+        """关闭实例并释放名额"""
+        try:
+            item.page.quit()
+        except Exception as e:
+            print(f"关闭浏览器时出错: {e}")
+        self._run_dispose_hook(item.options)
+        with self._lock:
+            self._created -= 1
+
+    def _replace_async(self):
+        """在后台补充一个新实例，避免阻塞当前请求的响应"""
+        def _worker():
+            with self._lock:
+                if self._closed or self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self._launch())
+            except Exception as e:
+                with self._lock:
+                    self._created -= 1
+                print(f"❌ 补充浏览器实例失败: {e}")
+        threading.Thread(target=_worker, daemon=True).start()
+
+    def _checkout(self, timeout):
+        # timeout <= 0 表示一直等待
+        deadline = time.time() + timeout if timeout > 0 else None
+        while True:
+            if self._closed:
+                raise RuntimeError("浏览器池已关闭")
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._launch()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("等待可用浏览器超时")
+                try:
+                    # 分段等待，期间补充实例失败空出名额或池被关闭时能及时发现
+                    item = self._idle.get(timeout=CHECKOUT_POLL_INTERVAL if remaining is None
+                                          else min(remaining, CHECKOUT_POLL_INTERVAL))
+                except queue.Empty:
+                    continue
+
+            if self._is_healthy(item):
+                return item
+            print("浏览器实例不健康，丢弃并重新获取")
+            self._dispose(item)
+
+    def _release(self, item, broken=False):
+        try:
+            item.page.listen.stop()
+        except Exception:
+            pass
+        item.uses += 1
+        retired = bool(self.should_retire and self.should_retire(item.page))
+        if broken or retired or self._closed or item.uses >= self.max_uses:
+            reason = '出错' if broken else '会话已停用' if retired else f'已使用 {item.uses} 次'
+            print(f"回收浏览器实例（{reason}）")
+            self._dispose(item)
+            if not self._closed:
+                self._replace_async()
+        else:
+            self._idle.put(item)
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """借出一个浏览器页面对象，with 块结束后自动归还
+
+        timeout 为 None 时使用 checkout_timeout，小于等于 0 时一直等到有浏览器可用。
+        """
+        with timed('browser_checkout'):
+            item = self._checkout(self.checkout_timeout if timeout is None else timeout)
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield item.page
+        finally:
+            # 出错的实例也先归还，下次借出前的健康检查会剔除真正损坏的浏览器
+            with self._lock:
+                self._in_use -= 1
+            self._release(item)
+
+    def stats(self):
+        """返回池的当前状态"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+            }
+
+    def close(self):
+        """关闭池中所有空闲实例"""
+        self._closed = True
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._dispose(item)
+
+
+def run_in_tabs(browser, items, worker, concurrency=4, setup=None, endpoint=None):
+    """
+    在同一个浏览器的多个标签页中并发处理 items。
+    worker(tab, item) 返回处理结果；返回值与 items 一一对应，每项为 (结果, 异常)。
+    setup(tab) 在每个新打开的标签页上调用一次。
+    endpoint 为标签页线程中阶段耗时所属的接口，默认为调用线程正在处理的接口。
+    """
+    if not items:
+        return []
+    endpoint = endpoint or current_endpoint()
+    concurrency = max(1, min(int(concurrency), len(items)))
+    work = queue.Queue()
+    for i, item in enumerate(items):
+        work.put((i, item))
+    outcomes = [(None, None)] * len(items)
+
+    def _run(tab):
+        # 线程局部的请求信息不会传到新线程，否则耗时都归到 background
+        begin_request(endpoint)
+        while True:
+            try:
+                i, item = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                outcomes[i] = (worker(tab, item), None)
+            except Exception as e:
+                print(f"标签页处理出错: {e}")
+                outcomes[i] = (None, e)
+
+    # 浏览器自身的当前标签页也参与处理，只需额外打开 concurrency - 1 个标签页
+    tabs = []
+    try:
+        for _ in range(concurrency - 1):
+            tab = browser.new_tab()
+            tabs.append(tab)
+            if setup:
+                setup(tab)
+        threads = [threading.Thread(target=_run, args=(tab,), daemon=True) for tab in [browser] + tabs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        for tab in tabs:
+            try:
+                tab.close()
+            except Exception as e:
+                print(f"关闭标签页时出错: {e}")
+    return outcomes
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import fcntl
+import hashlib
+import itertools
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from metrics import timed
+
+# 复制用户资料时跳过的缓存和锁文件，它们与登录态无关，复制反而会拖慢启动或导致 Chrome 拒绝启动
+PROFILE_IGNORE_PATTERNS = (
+    'Singleton*', 'lockfile', 'LOCK', '*.tmp',
+    'Cache', 'Code Cache', 'GPUCache', 'ShaderCache', 'GrShaderCache', 'DawnCache',
+    'GraphiteDawnCache', 'CacheStorage', 'ScriptCache', 'Crashpad', 'BrowserMetrics*',
+)
+# 定期从源资料目录中删除的缓存目录
+PROFILE_CACHE_DIRS = frozenset((
+    'Cache', 'Code Cache', 'GPUCache', 'ShaderCache', 'GrShaderCache', 'DawnCache',
+    'GraphiteDawnCache', 'CacheStorage', 'ScriptCache',
+))
+# 可以硬链接的文件：LevelDB 的 SSTable 写完后只读，压缩时整体删除
+IMMUTABLE_FILE_SUFFIXES = ('.ldb', '.sst')
+# 快照中的锁文件：物化期间持有共享锁，prune 只删除能拿到排他锁的快照（多个 worker 进程共享快照目录）
+SNAPSHOT_LOCK_NAME = '.snapshot-lock'
+# 决定快照是否需要重建的登录态文件
+PROFILE_SIGNATURE_FILES = (
+    'Local State', 'Default/Cookies', 'Default/Network/Cookies', 'Default/Preferences',
+    'Default/Local Storage/leveldb', 'Default/Login Data',
+)
+
+
+class PortAllocator:
+    """为每个浏览器实例分配独立的远程调试端口"""
+
+    def __init__(self, host='127.0.0.1'):
+        self.host = host
+        self._reserved = set()
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        """向系统申请一个当前空闲、且本进程尚未分配出去的端口"""
+        with self._lock:
+            for _ in range(50):
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                    sock.bind((self.host, 0))
+                    port = sock.getsockname()[1]
+                if port not in self._reserved:
+                    self._reserved.add(port)
+                    return port
+        raise RuntimeError("无法分配空闲的调试端口")
+
+    def release(self, port):
+        """归还端口"""
+        with self._lock:
+            self._reserved.discard(port)
+
+
+class ProfileCloner:
+    """
+    为每个浏览器实例准备一份独立的已登录用户资料目录。
+
+    源资料目录（login.py 登录后的 ~/drissionpagedata 等）先去掉缓存冻结成一份快照，
+    源目录的登录态文件没有变化时一直复用；每次启动浏览器时从快照物化出一份一次性副本：
+    - mode='hardlink'：只有确定不会被改写的 LevelDB SSTable（*.ldb）用硬链接，其余文件都复制；
+      快照不含缓存，物化耗时和写入量只取决于登录态数据的大小，与源目录用了多久无关；
+    - mode='copy'：全部复制（快照与工作目录不在同一文件系统时也会自动退回复制）。
+    工作目录默认放在 /dev/shm（tmpfs），浏览器运行期间的缓存读写不落盘。
+    """
+
+    def __init__(self, source_dir, work_root=None, mode='hardlink'):
+        self.source_dir = source_dir
+        work_root = work_root or os.path.join(_default_tmp_root(), 'douyindata_profiles')
+        # 每个进程使用独立的子目录，多个 worker 进程之间互不干扰；快照目录由各进程共享
+        self.work_dir = os.path.join(work_root, f'pid-{os.getpid()}')
+        self.snapshot_dir = os.path.join(work_root, 'snapshots')
+        self.work_root = work_root
+        self.mode = mode
+        self.linked_files = 0
+        self.copied_files = 0
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pruner = None
+
+    def _new_target(self):
+        target = os.path.join(self.work_dir, f'worker-{next(self._counter)}')
+        if os.path.exists(target):
+            shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(self.work_dir, exist_ok=True)
+        return target
+
+    def snapshot(self, source_dir=None):
+        """返回源资料目录当前登录态对应的快照路径，不存在时创建（缓存和锁文件不进入快照）"""
+        source_dir = os.path.abspath(source_dir or self.source_dir)
+        name = f'{_digest(source_dir)}-{_digest(repr(_profile_signature(source_dir)))}'
+        path = os.path.join(self.snapshot_dir, name)
+        with self._lock:
+            if os.path.isdir(path):
+                return path
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            building = f'{path}.building-{os.getpid()}'
+            shutil.rmtree(building, ignore_errors=True)
+            try:
+                shutil.copytree(
+                    source_dir,
+                    building,
+                    symlinks=True,
+                    ignore=shutil.ignore_patterns(*PROFILE_IGNORE_PATTERNS),
+                    ignore_dangling_symlinks=True,
+                )
+            except shutil.Error as e:
+                # 源目录正被其他 Chrome 使用时个别文件可能复制失败，不影响登录态
+                print(f"创建用户资料快照时部分文件失败（忽略）: {len(e.args[0])} 个")
+            open(os.path.join(building, SNAPSHOT_LOCK_NAME), 'a').close()
+            try:
+                os.rename(building, path)
+            except OSError:
+                # 其他进程已经创建了同一份快照
+                shutil.rmtree(building, ignore_errors=True)
+            print(f"已创建用户资料快照: {path}")
+            return path
+
+    def clone(self, source_dir=None):
+        """从源用户资料（默认为 source_dir，可指定其他登录会话的资料目录）的快照物化副本，返回新目录路径"""
+        for _ in range(3):
+            snapshot = self.snapshot(source_dir)
+            # 持有共享锁直到物化完成，其他进程的 prune 不会在此期间删除快照
+            lock = _lock_snapshot(snapshot, fcntl.LOCK_SH)
+            if lock:
+                break
+        else:
+            raise RuntimeError("用户资料快照在物化前被反复清理")
+        try:
+            target = self._new_target()
+            with timed('profile_materialize'):
+                linked, copied = _materialize(snapshot, target, hardlink=self.mode == 'hardlink')
+        finally:
+            lock.close()
+        self.linked_files += linked
+        self.copied_files += copied
+        print(f"已物化用户资料到: {target}（硬链接 {linked} 个，复制 {copied} 个文件）")
+        return target
+
+    def create_empty(self):
+        """创建一个空的用户资料目录，供通过 Cookie 登录的会话使用"""
+        target = self._new_target()
+        os.makedirs(target)
+        return target
+
+    def remove(self, path):
+        """删除复制出来的用户资料目录"""
+        if path and os.path.abspath(path).startswith(os.path.abspath(self.work_dir) + os.sep):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def cleanup_stale(self):
+        """清理已退出进程遗留的用户资料目录"""
+        if not os.path.isdir(self.work_root):
+            return
+        for name in os.listdir(self.work_root):
+            if not name.startswith('pid-'):
+                continue
+            try:
+                pid = int(name[4:])
+            except ValueError:
+                continue
+            if pid == os.getpid() or _pid_alive(pid):
+                continue
+            print(f"清理遗留的用户资料目录: {name}")
+            shutil.rmtree(os.path.join(self.work_root, name), ignore_errors=True)
+
+    def prune(self, source_dirs=()):
+        """
+        定期清理：删除过期的快照（已物化的副本是硬链接或复制品，不依赖快照目录；
+        正在被任一进程物化的快照拿不到排他锁，留到下次清理）、
+        已退出进程遗留的副本，以及没有 Chrome 在使用的源资料目录中的缓存。
+        返回释放的字节数。
+        """
+        freed = 0
+        self.cleanup_stale()
+        sources = {os.path.abspath(d) for d in (self.source_dir, *source_dirs) if d}
+        current = {f'{_digest(d)}-{_digest(repr(_profile_signature(d)))}' for d in sources}
+        if os.path.isdir(self.snapshot_dir):
+            with self._lock:
+                for name in os.listdir(self.snapshot_dir):
+                    if name in current:
+                        continue
+                    path = os.path.join(self.snapshot_dir, name)
+                    if '.building-' in name or '.deleting-' in name:
+                        # 正在创建或删除的快照，所属进程已退出时才清理
+                        if _pid_alive(_marker_pid(name)):
+                            continue
+                    else:
+                        lock = _lock_snapshot(path, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        if lock is None:
+                            continue
+                        try:
+                            # 持有排他锁时改名，之后加锁的进程会发现快照已不存在
+                            deleting = f'{path}.deleting-{os.getpid()}'
+                            os.rename(path, deleting)
+                        finally:
+                            lock.close()
+                        path = deleting
+                    freed += _tree_size(path)
+                    shutil.rmtree(path, ignore_errors=True)
+        for source in sources:
+            if os.path.lexists(os.path.join(source, 'SingletonLock')):
+                continue  # login.py 的浏览器正在使用
+            for root, dirs, _ in os.walk(source):
+                for name in list(dirs):
+                    if name in PROFILE_CACHE_DIRS:
+                        path = os.path.join(root, name)
+                        freed += _tree_size(path)
+                        shutil.rmtree(path, ignore_errors=True)
+                        dirs.remove(name)
+        if freed:
+            print(f"清理用户资料缓存和过期快照，释放 {freed / 1024 / 1024:.1f} MB")
+        return freed
+
+    def start_pruning(self, interval, source_dirs=()):
+        """在后台线程中每隔 interval 秒执行一次 prune()"""
+        if self._pruner or interval <= 0:
+            return
+
+        def _loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.prune(source_dirs)
+                except OSError as e:
+                    print(f"清理用户资料缓存出错: {e}")
+
+        self._pruner = threading.Thread(target=_loop, name='profile-pruner', daemon=True)
+        self._pruner.start()
+
+    def stats(self):
+        return {'linked_files': self.linked_files, 'copied_files': self.copied_files}
+
+    def cleanup(self):
+        """停止定期清理并删除本进程复制出来的全部用户资料"""
+        self._stop.set()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def _default_tmp_root():
+    """优先使用 tmpfs（/dev/shm），不可用时使用系统临时目录"""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def _profile_signature(source_dir):
+    """登录态相关文件的修改时间和大小，任一变化（如重新登录）时生成新的快照"""
+    signature = []
+    for name in PROFILE_SIGNATURE_FILES:
+        try:
+            st = os.stat(os.path.join(source_dir, name))
+        except OSError:
+            continue
+        signature.append((name, st.st_mtime_ns, st.st_size))
+    return signature
+
+
+def _lock_snapshot(path, operation):
+    """对快照加 flock 锁并返回打开的锁文件；快照已被删除、替换或（非阻塞时）锁被占用时返回 None"""
+    lock_path = os.path.join(path, SNAPSHOT_LOCK_NAME)
+    try:
+        f = open(lock_path, 'a')
+    except OSError:
+        return None
+    try:
+        fcntl.flock(f, operation)
+        # 等锁期间快照可能已被其他进程改名删除，锁文件必须仍是快照中的那一个
+        if os.stat(lock_path).st_ino == os.fstat(f.fileno()).st_ino:
+            return f
+    except OSError:
+        pass
+    f.close()
+    return None
+
+
+def _is_immutable(path):
+    """写入后不会再被改写、只会被删除的文件（LevelDB 的 SSTable），可以安全地硬链接
+
+    其他文件（SQLite 数据库、Visited Links、Preferences 等）Chrome 都可能原地改写，
+    硬链接会把改动写进快照和其他浏览器的副本，一律复制。
+    """
+    return os.path.basename(path).endswith(IMMUTABLE_FILE_SUFFIXES)
+
+
+def _materialize(snapshot, target, hardlink=True):
+    """把快照物化到 target，返回 (硬链接文件数, 复制文件数)"""
+    linked = copied = 0
+    for root, dirs, files in os.walk(snapshot):
+        relative = os.path.relpath(root, snapshot)
+        destination = os.path.normpath(os.path.join(target, relative))
+        os.makedirs(destination, exist_ok=True)
+        for name in files:
+            if name == SNAPSHOT_LOCK_NAME:
+                continue
+            source = os.path.join(root, name)
+            path = os.path.join(destination, name)
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), path)
+                continue
+            if hardlink and _is_immutable(source):
+                try:
+                    os.link(source, path)
+                    linked += 1
+                    continue
+                except OSError:
+                    hardlink = False  # 不在同一文件系统或不支持硬链接，之后全部复制
+            shutil.copy2(source, path)
+            copied += 1
+        for name in dirs:
+            source = os.path.join(root, name)
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), os.path.join(destination, name))
+    return linked, copied
+
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _marker_pid(name):
+    """*.building-<pid> / *.deleting-<pid> 中的进程号"""
+    try:
+        return int(name.rsplit('-', 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
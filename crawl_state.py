@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+from aweme_schema import VideoRecord
+
+USER_PATH_RE = re.compile(r'/user/([^/?#]+)')
+
+
+def profile_key(page_url):
+    """主页链接对应的存储键：优先使用 sec_uid，否则使用链接的哈希"""
+    match = USER_PATH_RE.search(urlparse(page_url).path)
+    if match:
+        return match.group(1)
+    return 'url-' + hashlib.sha1(page_url.encode('utf-8')).hexdigest()[:16]
+
+
+class ProfileState:
+    """单个主页上次采集到的最新发布时间和视频集合"""
+
+    def __init__(self, key, data=None):
+        data = data or {}
+        self.key = key
+        self.newest_create_time = data.get('newest_create_time', 0)
+        self.updated_at = data.get('updated_at')
+        self._videos = {video['video_id']: VideoRecord.from_dict(video) for video in data.get('videos', [])}
+        # 载入时的快照：本次采集过程中新加入的视频不影响"是否已知"的判断
+        self.known_ids = frozenset(self._videos)
+        self._known_newest_time = self.newest_create_time
+        # 本次采集中出现过的视频ID，用于记录统计快照
+        self._crawled_ids = set()
+
+    @property
+    def videos(self):
+        """按发布时间倒序排列的全部视频（VideoRecord）"""
+        return sorted(self._videos.values(), key=lambda v: v.get('create_time', 0), reverse=True)
+
+    @property
+    def crawled_videos(self):
+        """本次采集中出现过的视频（包括增量模式下只刷新了统计数据的旧视频）"""
+        return [self._videos[video_id] for video_id in self._crawled_ids]
+
+    def is_known(self, video):
+        """视频是否已在上次采集中出现过（置顶视频只按ID判断）"""
+        if video['video_id'] in self.known_ids:
+            return True
+        if video.get('is_top'):
+            return False
+        return bool(self._known_newest_time) and video['create_time'] <= self._known_newest_time
+
+    def add(self, videos):
+        """把新采集到的视频并入集合，同ID的视频以新数据为准"""
+        for video in videos:
+            self._videos[video['video_id']] = video
+            self._crawled_ids.add(video['video_id'])
+            if not video.get('is_top') and video.get('create_time', 0) > (self.newest_create_time or 0):
+                self.newest_create_time = video['create_time']
+
+    def merge(self, new_videos):
+        """合并新采集的视频并返回合并后的全部视频"""
+        self.add(new_videos)
+        return self.videos
+
+    def to_dict(self):
+        return {
+            'newest_create_time': self.newest_create_time,
+            'updated_at': self.updated_at,
+            'videos': [video.to_dict() for video in self.videos],
+        }
+
+
+class DedupIndex:
+    """一次采集中按 aweme_id 去重的索引
+
+    重复加载的数据包会再次带来已处理过的视频：重复的记录不再输出，
+    但后到的数据更新，统计数据不同时就地刷新第一次输出的那条记录。
+    """
+
+    def __init__(self):
+        self._records = {}
+        self.duplicates = 0
+        self.refreshed = 0
+
+    def add(self, record):
+        """返回 (本次采集中该视频唯一的记录对象, 是否为重复记录)"""
+        existing = self._records.get(record['video_id'])
+        if existing is None:
+            self._records[record['video_id']] = record
+            return record, False
+        self.duplicates += 1
+        if existing.update_from(record):
+            self.refreshed += 1
+        return existing, True
+
+    def __contains__(self, video_id):
+        return video_id in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+
+class ProfileStateStore:
+    """把每个主页的采集状态保存为一个 JSON 文件"""
+
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.state_dir, f'{key}.json')
+
+    def load(self, page_url):
+        key = profile_key(page_url)
+        path = self._path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                return ProfileState(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return ProfileState(key, json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"读取主页采集状态失败，将重新全量采集: {e}")
+                return ProfileState(key)
+
+    def save(self, state):
+        state.updated_at = int(time.time())
+        path = self._path(state.key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state.to_dict(), f, ensure_ascii=False)
+            # 先写临时文件再替换，避免进程中断时留下半个文件
+            os.replace(tmp_path, path)
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import timed
+
+# 签名过期或被拒绝时需要重新解析下载地址
+EXPIRED_STATUS_CODES = (403, 404, 410)
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class DownloadError(Exception):
+    """下载失败（状态码异常、大小不符等）"""
+
+
+class UrlExpired(DownloadError):
+    """下载地址已过期，需要重新获取"""
+
+
+class ConnectionBusy(DownloadError):
+    """等待连接名额超时"""
+
+
+class ConnectionLimiter:
+    """
+    到 CDN 的连接数限制：连接总数不超过 max_connections，每个域名不超过 per_host。
+    服务中所有下载器和转发的响应共用一个实例，限制才对整个服务有效。
+    """
+
+    def __init__(self, max_connections=8, per_host=4):
+        self.max_connections = max(1, int(max_connections))
+        self.per_host = max(1, int(per_host))
+        self._total = threading.BoundedSemaphore(self.max_connections)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url):
+        host = urlparse(url).hostname or ''
+        with self._lock:
+            slot = self._hosts.get(host)
+            if slot is None:
+                slot = self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return slot
+
+    def acquire(self, url, timeout=None):
+        """
+        占用一个连接名额，返回释放函数（重复调用只释放一次）。
+        timeout 秒内没有名额时抛出 ConnectionBusy，None 表示一直等待。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        host = self._host(url)
+        if not self._total.acquire(timeout=timeout):
+            raise ConnectionBusy(f"等待下载连接超时（共 {self.max_connections} 个）")
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not host.acquire(timeout=remaining):
+            self._total.release()
+            raise ConnectionBusy(f"等待 {urlparse(url).hostname} 的下载连接超时（每个域名 {self.per_host} 个）")
+        held = [self._total, host]
+
+        def release():
+            while True:
+                try:
+                    held.pop().release()
+                except IndexError:
+                    return
+        return release
+
+    @contextmanager
+    def slot(self, url, timeout=None):
+        release = self.acquire(url, timeout)
+        try:
+            yield
+        finally:
+            release()
+
+
+class DownloadTask:
+    """一个视频文件的下载任务及其进度"""
+
+    def __init__(self, video_id, url, path):
+        self.video_id = video_id
+        self.url = url
+        self.path = path
+        self.status = 'queued'
+        self.total = None
+        self.downloaded = 0
+        self.resumed_bytes = 0
+        self.chunks = 0
+        self.chunks_done = 0
+        self.url_refreshes = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def advance(self, size):
+        with self._lock:
+            self.downloaded += size
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self.done.set()
+
+    def to_dict(self):
+        with self._lock:
+            elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0
+            fetched = self.downloaded - self.resumed_bytes
+            return {
+                'video_id': self.video_id,
+                'path': self.path,
+                'status': self.status,
+                'total': self.total,
+                'downloaded': self.downloaded,
+                'resumed_bytes': self.resumed_bytes,
+                'progress': round(self.downloaded / self.total, 4) if self.total else None,
+                'chunks': self.chunks,
+                'chunks_done': self.chunks_done,
+                'speed': round(fetched / elapsed) if elapsed > 0 else 0,
+                'url_refreshes': self.url_refreshes,
+                'error': self.error,
+            }
+
+
+class VideoDownloader:
+    """
+    并发、可断点续传的视频文件下载器。
+
+    - 文件大于 chunk_size 且服务器支持 Range 时按块并发下载，每块用 pwrite 写到 .part 文件的对应位置；
+    - 已完成的块记录在 .part.json 中，服务重启或下载中断后只下载缺少的块（ETag / 大小变化时重新下载）；
+    - 同时下载的文件不超过 max_files 个，连接总数不超过 max_connections，每个域名不超过 per_host；
+      传入 limiter / session 时与其他下载器共用连接名额和连接池，max_connections、per_host 以 limiter 为准；
+    - 下载完成后校验文件大小，再改名为正式文件；
+    - 下载地址过期（403/404/410）时调用 url_refresher(video_id) 重新获取地址后继续；
+    - 任务结束（成功或失败）后调用 on_finish(task)。
+    """
+
+    def __init__(self, download_dir, max_files=4, max_connections=8, per_host=4, chunk_size=4 * 1024 * 1024,
+                 timeout=30, retries=3, headers=None, url_refresher=None, on_finish=None, max_finished=1000,
+                 limiter=None, session=None):
+        self.download_dir = download_dir
+        self.chunk_size = max(STREAM_BLOCK_SIZE, int(chunk_size))
+        self.timeout = timeout
+        self.retries = retries
+        self.limiter = limiter or ConnectionLimiter(max_connections, per_host)
+        self.url_refresher = url_refresher
+        self.on_finish = on_finish
+        self.max_finished = max_finished
+        self.bytes_downloaded = 0
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(headers or {})
+        self.session = session
+        self._files = ThreadPoolExecutor(max_workers=max(1, int(max_files)), thread_name_prefix='download-file')
+        self._chunks = ThreadPoolExecutor(max_workers=max(1, int(max_connections)),
+                                          thread_name_prefix='download-chunk')
+        self._tasks = {}  # video_id -> DownloadTask，保留最近完成的任务供查询
+        self._lock = threading.Lock()
+        os.makedirs(download_dir, exist_ok=True)
+
+    def path_for(self, video_id):
+        return os.path.join(self.download_dir, f'{video_id}.mp4')
+
+    def submit(self, video_id, url):
+        """加入下载队列；同一视频正在下载时返回已有的任务"""
+        with self._lock:
+            task = self._tasks.get(video_id)
+            if task and task.status in ('queued', 'running'):
+                return task
+            task = DownloadTask(video_id, url, self.path_for(video_id))
+            self._tasks[video_id] = task
+            self._trim_finished()
+        self._files.submit(self._run, task)
+        return task
+
+    def _trim_finished(self):
+        finished = [vid for vid, task in self._tasks.items() if task.done.is_set()]
+        for vid in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._tasks[vid]
+
+    def get(self, video_id):
+        with self._lock:
+            return self._tasks.get(video_id)
+
+    def _run(self, task):
+        task.status = 'running'
+        task.started_at = time.time()
+        try:
+            if os.path.exists(task.path):
+                # 之前已经下载完成
+                task.total = task.downloaded = task.resumed_bytes = os.path.getsize(task.path)
+                task.finish('done')
+                return
+            with timed('download'):
+                self._download_with_refresh(task)
+            task.finish('done')
+            print(f"下载完成: {task.video_id} ({task.total} 字节)")
+        except Exception as e:
+            print(f"下载 {task.video_id} 失败: {e}")
+            task.finish('failed', str(e))
+        finally:
+            if self.on_finish:
+                self.on_finish(task)
+
+    def _download_with_refresh(self, task):
+        while True:
+            try:
+                return self._download(task)
+            except UrlExpired:
+                if not self.url_refresher or task.url_refreshes >= 2:
+                    raise
+                task.url_refreshes += 1
+                print(f"下载地址已过期，重新获取: {task.video_id}")
+                task.url = self.url_refresher(task.video_id)
+
+    def _probe(self, url):
+        """请求第一个字节，跟随跳转得到最终地址，并得到文件大小、是否支持 Range 和 ETag"""
+        for attempt in range(self.retries + 1):
+            try:
+                with self.limiter.slot(url):
+                    resp = self.session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=self.timeout)
+                    resp.close()
+                break
+            except requests.RequestException as e:
+                if attempt >= self.retries:
+                    raise
+                print(f"获取文件信息失败，重试 ({attempt + 1}/{self.retries}): {e}")
+                time.sleep(min(10, 2 ** attempt))
+        if resp.status_code in EXPIRED_STATUS_CODES:
+            raise UrlExpired(f"HTTP {resp.status_code}")
+        if resp.status_code == 206:
+            match = CONTENT_RANGE_RE.match(resp.headers.get('Content-Range', ''))
+            total = int(match.group(3)) if match and match.group(3) != '*' else None
+            return resp.url, total, total is not None, resp.headers.get('ETag')
+        if resp.status_code == 200:
+            length = resp.headers.get('Content-Length')
+            return resp.url, int(length) if length else None, False, resp.headers.get('ETag')
+        raise DownloadError(f"HTTP {resp.status_code}")
+
+    def _download(self, task):
+        final_url, total, ranged, etag = self._probe(task.url)
+        task.total = total
+        part_path = task.path + '.part'
+        if not ranged or total <= self.chunk_size:
+            self._download_whole(task, final_url, part_path)
+        else:
+            self._download_chunks(task, final_url, part_path, total, etag)
+        size = os.path.getsize(part_path)
+        if task.total is not None and size != task.total:
+            raise DownloadError(f"文件大小不符: {size} != {task.total}")
+        task.total = size
+        os.replace(part_path, task.path)
+        _remove(part_path + '.json')
+
+    def _download_whole(self, task, url, part_path):
+        """不支持 Range 或文件较小：整体下载，失败时重试"""
+        task.chunks = 1
+        for attempt in range(self.retries + 1):
+            task.downloaded = 0
+            try:
+                with self.limiter.slot(url):
+                    resp = self.session.get(url, stream=True, timeout=self.timeout)
+                    try:
+                        if resp.status_code in EXPIRED_STATUS_CODES:
+                            raise UrlExpired(f"HTTP {resp.status_code}")
+                        if resp.status_code != 200:
+                            raise DownloadError(f"HTTP {resp.status_code}")
+                        with open(part_path, 'wb') as f:
+                            for block in resp.iter_content(STREAM_BLOCK_SIZE):
+                                f.write(block)
+                                task.advance(len(block))
+                                self.bytes_downloaded += len(block)
+                    finally:
+                        resp.close()
+                task.chunks_done = 1
+                return
+            except UrlExpired:
+                raise
+            except (requests.RequestException, DownloadError) as e:
+                if attempt >= self.retries:
+                    raise
+                print(f"下载 {task.video_id} 失败，重试 ({attempt + 1}/{self.retries}): {e}")
+                time.sleep(min(10, 2 ** attempt))
+
+    def _download_chunks(self, task, url, part_path, total, etag):
+        ranges = [(start, min(start + self.chunk_size, total) - 1) for start in range(0, total, self.chunk_size)]
+        state_path = part_path + '.json'
+        done = self._load_progress(state_path, part_path, total, etag)
+        task.chunks = len(ranges)
+        task.chunks_done = len(done)
+        task.downloaded = task.resumed_bytes = sum(ranges[i][1] - ranges[i][0] + 1 for i in done)
+        if done:
+            print(f"断点续传 {task.video_id}: 已完成 {len(done)}/{len(ranges)} 块")
+
+        mode = 'r+b' if os.path.exists(part_path) else 'w+b'
+        with open(part_path, mode) as f:
+            f.truncate(total)
+            fd = f.fileno()
+            state_lock = threading.Lock()
+
+            def _fetch(index):
+                start, end = ranges[index]
+                self._fetch_range(task, url, fd, start, end)
+                with state_lock:
+                    done.add(index)
+                    task.chunks_done = len(done)
+                    _save_progress(state_path, total, self.chunk_size, etag, done)
+
+            futures = [self._chunks.submit(_fetch, i) for i in range(len(ranges)) if i not in done]
+            errors = []
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+            if errors:
+                expired = [e for e in errors if isinstance(e, UrlExpired)]
+                raise expired[0] if expired else errors[0]
+            os.fsync(fd)
+
+    def _fetch_range(self, task, url, fd, start, end):
+        """下载一个块，失败时重试；写入一半失败的块整块重新下载"""
+        for attempt in range(self.retries + 1):
+            written = 0
+            try:
+                with self.limiter.slot(url):
+                    resp = self.session.get(url, headers={'Range': f'bytes={start}-{end}'}, stream=True,
+                                            timeout=self.timeout)
+                    try:
+                        if resp.status_code in EXPIRED_STATUS_CODES:
+                            raise UrlExpired(f"HTTP {resp.status_code}")
+                        if resp.status_code != 206:
+                            raise DownloadError(f"分块请求返回 HTTP {resp.status_code}")
+                        for block in resp.iter_content(STREAM_BLOCK_SIZE):
+                            os.pwrite(fd, block, start + written)
+                            written += len(block)
+                            task.advance(len(block))
+                            self.bytes_downloaded += len(block)
+                    finally:
+                        resp.close()
+                if written != end - start + 1:
+                    raise DownloadError(f"分块大小不符: {written} != {end - start + 1}")
+                return
+            except UrlExpired:
+                task.advance(-written)
+                raise
+            except (requests.RequestException, DownloadError) as e:
+                task.advance(-written)
+                if attempt >= self.retries:
+                    raise
+                print(f"分块 {start}-{end} 下载失败，重试 ({attempt + 1}/{self.retries}): {e}")
+                time.sleep(min(10, 2 ** attempt))
+
+    def _load_progress(self, state_path, part_path, total, etag):
+        """读取已完成的块；文件已变化或进度文件与 .part 文件不匹配时从头下载"""
+        try:
+            with open(state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if (state.get('total') != total or state.get('chunk_size') != self.chunk_size
+                or state.get('etag') != etag or not os.path.exists(part_path)):
+            _remove(part_path)
+            return set()
+        return set(state.get('done', []))
+
+    def entries(self):
+        with self._lock:
+            tasks = list(self._tasks.values())
+        return [task.to_dict() for task in tasks]
+
+    def stats(self):
+        with self._lock:
+            tasks = list(self._tasks.values())
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        for task in tasks:
+            counts[task.status] += 1
+        counts['bytes_downloaded'] = self.bytes_downloaded
+        return counts
+
+    def close(self):
+        self._files.shutdown(wait=False, cancel_futures=True)
+        self._chunks.shutdown(wait=False, cancel_futures=True)
+
+
+def _save_progress(state_path, total, chunk_size, etag, done):
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'total': total, 'chunk_size': chunk_size, 'etag': etag, 'done': sorted(done)}, f)
+    os.replace(tmp_path, state_path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
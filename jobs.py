@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class JobQueueFull(Exception):
+    """任务队列已满，拒绝新的任务"""
+
+
+class Job:
+    """一个后台任务及其进度和（部分）结果"""
+
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.progress = {}
+        self.results = []
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def add_result(self, result):
+        with self._lock:
+            self.results.append(result)
+
+    def set_progress(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+
+    def to_dict(self, offset=0):
+        """offset 之后的结果一并返回，轮询方可以只取新增部分"""
+        with self._lock:
+            return {
+                'id': self.id,
+                'type': self.kind,
+                'params': self.params,
+                'status': self.status,
+                'progress': dict(self.progress),
+                'result_count': len(self.results),
+                'results': self.results[offset:],
+                'offset': offset,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+
+
+class JobManager:
+    """固定数量的工作线程 + 有界队列的后台任务管理器
+
+    handlers: {任务类型: 处理函数}，处理函数接收 Job，通过 add_result / set_progress 汇报进度。
+    """
+
+    def __init__(self, handlers, workers=2, max_queue=100, max_finished=500):
+        self.handlers = handlers
+        self.workers = max(1, int(workers))
+        self.max_finished = max_finished
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._running = 0
+
+    def start(self):
+        """启动工作线程"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'job-worker-{i + 1}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"✅ 后台任务线程已启动: {self.workers} 个")
+
+    def submit(self, kind, params):
+        """提交任务，队列已满时抛出 JobQueueFull"""
+        if kind not in self.handlers:
+            raise ValueError(f'unknown job type: {kind}')
+        self.start()
+        job = Job(kind, params)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise JobQueueFull('job queue is full')
+        print(f"已提交任务 {job.id} ({kind})，排队中: {self._queue.qsize()}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._running += 1
+            job.status = 'running'
+            job.started_at = time.time()
+            print(f"开始执行任务 {job.id} ({job.kind})")
+            try:
+                self.handlers[job.kind](job)
+                job.status = 'done'
+            except Exception as e:
+                print(f"任务 {job.id} 执行失败: {e}")
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._running -= 1
+                self._evict_finished()
+                self._queue.task_done()
+
+    def _evict_finished(self):
+        """只保留最近的 max_finished 个已结束任务"""
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.status in ('done', 'failed')]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'running': self._running,
+                'queued': self._queue.qsize(),
+                'max_queue': self._queue.maxsize,
+                'tracked_jobs': len(self._jobs),
+            }
@@ -7,85 +7,29 @@ import time
 import subprocess
 import signal
 from DrissionPage import Chromium, ChromiumPage, ChromiumOptions
+from xvfb_pool import DisplayPool
 
 user_data_dir = os.path.join(os.path.expanduser('~'), 'drissionpagedata')
 os.makedirs(user_data_dir, exist_ok=True)
 
-class XvfbManager:
-    """Xvfb虚拟显示器管理器"""
+def create_chrome_options(port=9222, profile_dir=None, display=None):
+    """创建Chrome选项配置
 
-    def __init__(self, display=':99', screen='0', resolution='1920x1080x24'):
-        self.display = display
-        self.screen = screen
-        self.resolution = resolution
-        self.xvfb_process = None
-
-    def start(self):
-        """启动Xvfb虚拟显示器"""
-        try:
-            # 清理可能存在的Xvfb进程
-            self.cleanup()
-
-            print(f"启动Xvfb虚拟显示器: DISPLAY={self.display}")
-
-            # 启动Xvfb，加上了GLX扩展，这可能是之前成功的关键
-            cmd = ['Xvfb', self.display, '-screen', self.screen, self.resolution, '-ac', '+extension', 'GLX']
-            self.xvfb_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.PIPE
-            )
-
-            # 设置环境变量
-            os.environ['DISPLAY'] = self.display
-
-            # 等待Xvfb启动
-            time.sleep(3)
-
-            # 检查Xvfb是否正常运行
-            if self.xvfb_process.poll() is None:
-                print(f"✅ Xvfb启动成功，DISPLAY={self.display}")
-                return True
-            else:
-                stderr_output = self.xvfb_process.stderr.read().decode()
-                print(f"❌ Xvfb启动失败: {stderr_output}")
-                return False
-
-        except Exception as e:
-            print(f"❌ 启动Xvfb时出错: {e}")
-            return False
-
-    def stop(self):
-        """停止Xvfb"""
-        if self.xvfb_process and self.xvfb_process.poll() is None:
-            print("停止Xvfb进程...")
-            self.xvfb_process.terminate()
-            try:
-                self.xvfb_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.xvfb_process.kill()
-
-    def cleanup(self):
-        """清理残留的Xvfb进程"""
-        try:
-            subprocess.run(['pkill', '-f', f'Xvfb.*{self.display}'],
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL)
-            time.sleep(1)
-        except:
-            pass
-
-def create_chrome_options():
-    """创建Chrome选项配置"""
+    port / profile_dir 可为每个浏览器指定独立的调试端口和用户资料目录，
+    默认使用 9222 端口和登录用的主资料目录 ~/drissionpagedata。
+    display 为 Xvfb 显示器名（如 ':99'），通过 --display 参数只传给这个浏览器。
+    """
     options = ChromiumOptions()
-    options.set_user_data_path(user_data_dir)
+    options.set_user_data_path(profile_dir or user_data_dir)
+    if display:
+        options.set_argument('--display', display)
 
     # 基础选项（保留有助于稳定性和反检测的）
     options.set_argument('--no-sandbox')
     options.set_argument('--disable-dev-shm-usage') # 避免共享内存问题
     options.set_argument('--disable-gpu') # 因为没有物理GPU
     options.set_argument('--window-size=1920,1080') # 截图所需分辨率
-    options.set_argument('--remote-debugging-port=9222') # 用于DrissionPage连接
+    options.set_local_port(port) # 用于DrissionPage连接
     options.set_argument('--accept-lang','zh-CN')
 
     # 其他一些有助于稳定性的参数
@@ -116,8 +60,12 @@ def create_chrome_options():
 
     return options
 
-def test_douyin_page():
-    """测试访问抖音页面并截图"""
+def test_douyin_page(profile_dir=None):
+    """测试访问抖音页面并截图
+
+    profile_dir 指定登录到哪个用户资料目录，默认 ~/drissionpagedata；
+    登录多个账号时为每个账号指定不同目录，再通过 app.py 的 SESSION_PROFILES 加入登录会话池。
+    """
     xvfb = None
     browser = None
     page = None
@@ -128,14 +76,16 @@ def test_douyin_page():
         print("="*50)
 
         # 1. 启动Xvfb
-        xvfb = XvfbManager()
+        xvfb = DisplayPool(size=1)
         if not xvfb.start():
             print("❌ Xvfb启动失败，退出测试")
             return False
 
         # 2. 创建浏览器实例
         print("\n🚀 创建浏览器实例...")
-        options = create_chrome_options()
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+        options = create_chrome_options(profile_dir=profile_dir, display=xvfb.acquire())
         page = ChromiumPage(options)
 
         # 获取页面对象
@@ -461,7 +411,8 @@ if __name__ == "__main__":
     # 运行主测试
     print("\n" + "="*50)
     print("运行抖音页面测试")
-    success = test_douyin_page()
+    # 可选参数：用户资料目录，例如 python login.py ~/douyin_sessions/account2
+    success = test_douyin_page(os.path.expanduser(sys.argv[1]) if len(sys.argv) > 1 else None)
 
     if success:
         print("\n🎉 抖音页面测试成功！相关截图已保存。")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class MediaCache:
+    """最近下载过的视频文件的磁盘 LRU 缓存
+
+    文件保存为 <cache_dir>/<aweme_id>.mp4，总大小超过 max_bytes 时删除最久未访问的文件；
+    访问时更新文件的修改时间，服务重启后按修改时间恢复访问顺序。
+    正在被 send_file 发送的文件被删除也没有关系，已打开的文件描述符仍然有效。
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # aweme_id -> 文件大小
+        self._size = 0
+        self._filling = set()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not name.endswith('.mp4'):
+                # 上次运行遗留的临时文件
+                if '.tee-' in name:
+                    os.remove(path)
+                continue
+            st = os.stat(path)
+            files.append((st.st_mtime, name[:-4], st.st_size))
+        for _, aweme_id, size in sorted(files):
+            self._entries[aweme_id] = size
+            self._size += size
+        with self._lock:
+            self._evict()
+
+    def path_for(self, aweme_id):
+        return os.path.join(self.cache_dir, f'{aweme_id}.mp4')
+
+    def get(self, aweme_id):
+        """命中时返回文件路径并标记为最近使用，否则返回 None"""
+        path = self.path_for(aweme_id)
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                if aweme_id in self._entries:
+                    self._size -= self._entries.pop(aweme_id)
+                self.misses += 1
+                return None
+            if aweme_id not in self._entries:
+                self._size += size
+            self._entries[aweme_id] = size
+            self._entries.move_to_end(aweme_id)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def add(self, aweme_id):
+        """登记一个已经写入缓存目录的文件（例如由下载器写入），必要时淘汰旧文件"""
+        try:
+            size = os.path.getsize(self.path_for(aweme_id))
+        except OSError:
+            return
+        with self._lock:
+            self._size += size - self._entries.pop(aweme_id, 0)
+            self._entries[aweme_id] = size
+            self._evict()
+
+    def begin_fill(self, aweme_id):
+        """开始写入缓存，同一视频已经在写入时返回 False，避免重复下载"""
+        with self._lock:
+            if aweme_id in self._filling:
+                return False
+            self._filling.add(aweme_id)
+            return True
+
+    def end_fill(self, aweme_id):
+        with self._lock:
+            self._filling.discard(aweme_id)
+
+    def temp_path(self, aweme_id):
+        return os.path.join(self.cache_dir, f'{aweme_id}.tee-{uuid.uuid4().hex[:8]}')
+
+    def commit(self, aweme_id, temp_path):
+        """把写完的临时文件放入缓存"""
+        os.replace(temp_path, self.path_for(aweme_id))
+        self.add(aweme_id)
+
+    def _evict(self):
+        # 至少保留刚加入的文件，即使它本身超过上限
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            aweme_id, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(aweme_id))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'filling': len(self._filling),
+            }
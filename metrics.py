@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    """耗时分布直方图"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # key -> [各桶计数..., 总和, 总数]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self._lock:
+            entry = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for i, bound in enumerate(self.buckets):
+                    labels = _format_labels(self.labelnames, key, [('le', repr(float(bound)))])
+                    lines.append(f'{self.name}_bucket{labels} {entry[i]}')
+                labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+                lines.append(f'{self.name}_bucket{labels} {entry[-1]}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {entry[-2]}')
+                lines.append(f'{self.name}_count{labels} {entry[-1]}')
+        return lines
+
+
+class Gauge:
+    """取值时调用回调函数的仪表盘指标，用于浏览器池、任务队列等当前状态
+
+    callback 返回一个数值，或 {标签值元组: 数值} 字典。
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"读取指标 {self.name} 时出错: {e}")
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """输出 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'douyin_stage_seconds', '各处理阶段耗时（秒）', ('endpoint', 'stage'),
+))
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    'douyin_requests_total', 'HTTP 请求数', ('endpoint', 'status'),
+))
+
+# 当前线程正在处理的请求，用于把阶段耗时归到对应接口并生成单次请求的耗时明细
+_local = threading.local()
+
+
+def begin_request(endpoint):
+    """开始记录一个请求的阶段耗时"""
+    _local.endpoint = endpoint
+    _local.timings = {}
+
+
+def current_endpoint():
+    """当前线程正在处理的接口，不在请求中时为 background"""
+    return getattr(_local, 'endpoint', 'background')
+
+
+def current_timings():
+    """当前请求各阶段的累计耗时（秒）"""
+    return {stage: round(seconds, 4) for stage, seconds in getattr(_local, 'timings', {}).items()}
+
+
+@contextmanager
+def timed(stage, endpoint=None):
+    """统计 with 块的耗时：写入直方图，并累加到当前请求的耗时明细"""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started_at
+        STAGE_SECONDS.observe(elapsed, endpoint=endpoint or current_endpoint(), stage=stage)
+        timings = getattr(_local, 'timings', None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
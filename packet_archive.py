@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网络数据包的录制与回放。
+
+录制：设置 PACKET_CAPTURE_DIR 后，服务把监听到的 aweme/post、aweme/detail 响应
+（URL、状态码、响应头、响应体）追加写入 <目录>/<类型>-<日期>-<进程号>.jsonl.gz。
+
+回放：不启动浏览器，把归档中的数据包送入与线上相同的解析流程，用于复现解析失败和单独分析解析性能：
+    python packet_archive.py capture/post-20250101-1234.jsonl.gz --profile
+"""
+
+import argparse
+import cProfile
+import glob
+import gzip
+import json
+import os
+import pstats
+import threading
+import time
+
+from aweme_schema import load_body
+
+KIND_POST = 'post'
+KIND_DETAIL = 'detail'
+
+
+def packet_to_record(kind, packet):
+    """把 DrissionPage 的数据包转换为可序列化的记录"""
+    response = packet.response
+    body = load_body(packet)
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', errors='replace')
+    return {
+        'kind': kind,
+        'captured_at': round(time.time(), 3),
+        'url': packet.url,
+        'status': getattr(response, 'status', None),
+        'headers': dict(response.headers or {}),
+        'body': body,
+    }
+
+
+class PacketCapture:
+    """把数据包追加写入 gzip 压缩的 JSONL 归档
+
+    每条记录单独压缩为一个 gzip 成员，进程中途退出时已写入的记录仍然完整可读。
+    """
+
+    def __init__(self, capture_dir=None):
+        self.capture_dir = capture_dir
+        self.captured = 0
+        self._lock = threading.Lock()
+        if capture_dir:
+            os.makedirs(capture_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return bool(self.capture_dir)
+
+    def archive_path(self, kind):
+        return os.path.join(self.capture_dir, f"{kind}-{time.strftime('%Y%m%d')}-{os.getpid()}.jsonl.gz")
+
+    def record(self, kind, packet):
+        """录制一个数据包；录制失败只打印日志，不影响采集"""
+        if not self.enabled:
+            return
+        try:
+            line = json.dumps(packet_to_record(kind, packet), ensure_ascii=False, separators=(',', ':'))
+            with self._lock:
+                with gzip.open(self.archive_path(kind), 'ab') as f:
+                    f.write(line.encode('utf-8') + b'\n')
+                self.captured += 1
+        except Exception as e:
+            print(f"录制数据包失败（忽略）: {e}")
+
+
+class ReplayResponse:
+    def __init__(self, record):
+        self.status = record.get('status')
+        self.headers = record.get('headers') or {}
+        self.body = record.get('body')
+
+
+class ReplayPacket:
+    """回放用的数据包，提供与 DrissionPage 数据包相同的 url / response.body 等属性"""
+
+    def __init__(self, record):
+        self.kind = record.get('kind')
+        self.url = record.get('url')
+        self.captured_at = record.get('captured_at')
+        self.response = ReplayResponse(record)
+
+
+def iter_archive(path):
+    """逐条读取归档中的数据包"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield ReplayPacket(json.loads(line))
+
+
+def replay_packets(packets):
+    """把数据包送入线上使用的解析函数，返回统计信息和失败列表"""
+    # 延迟导入，只使用回放功能时不依赖服务的其他模块
+    from crawl_state import DedupIndex, ProfileState
+    from profile_crawler import CrawlSummary, _process_packet
+    from video_detail import parse_detail_video_url
+
+    state = ProfileState('replay')
+    summary = CrawlSummary()
+    index = DedupIndex()
+    stats = {'packets': 0, 'videos': 0, 'detail_urls': 0, 'failures': []}
+    for packet in packets:
+        stats['packets'] += 1
+        try:
+            if packet.kind == KIND_DETAIL:
+                parse_detail_video_url(packet.response.body)
+                stats['detail_urls'] += 1
+            else:
+                new_videos, _ = _process_packet(packet.response.body, state, False, summary, index)
+                stats['videos'] += len(new_videos)
+        except Exception as e:
+            stats['failures'].append({'url': packet.url, 'captured_at': packet.captured_at, 'error': repr(e)})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回放录制的网络数据包')
+    parser.add_argument('archives', nargs='+', help='归档文件或目录')
+    parser.add_argument('--repeat', type=int, default=1, help='重复回放次数，用于测量解析耗时')
+    parser.add_argument('--profile', action='store_true', help='使用 cProfile 分析解析耗时')
+    parser.add_argument('--top', type=int, default=25, help='--profile 时输出的函数数量')
+    args = parser.parse_args()
+
+    paths = []
+    for archive in args.archives:
+        if os.path.isdir(archive):
+            paths.extend(sorted(glob.glob(os.path.join(archive, '*.jsonl.gz'))))
+        else:
+            paths.append(archive)
+    # 先全部载入内存，计时只包含解析
+    packets = [packet for path in paths for packet in iter_archive(path)]
+    print(f"已载入 {len(paths)} 个归档，共 {len(packets)} 个数据包")
+
+    replay_packets([])  # 先完成解析模块的导入，不计入耗时
+    profiler = cProfile.Profile() if args.profile else None
+    started_at = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    for _ in range(args.repeat):
+        stats = replay_packets(packets)
+    if profiler:
+        profiler.disable()
+    elapsed = time.perf_counter() - started_at
+
+    total = len(packets) * args.repeat
+    print(f"解析 {total} 个数据包耗时 {elapsed:.3f} 秒，"
+          f"{total / elapsed if elapsed else 0:.0f} 个/秒；"
+          f"视频 {stats['videos']} 个，详情播放地址 {stats['detail_urls']} 个，失败 {len(stats['failures'])} 个")
+    for failure in stats['failures'][:20]:
+        print(f"  解析失败: {failure['url']} ({failure['captured_at']}): {failure['error']}")
+    if profiler:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(args.top)
+
+
+if __name__ == '__main__':
+    main()
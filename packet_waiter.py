@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+
+class AdaptiveTimeout:
+    """根据最近观察到的接口响应耗时（指数加权平均）估算等待超时"""
+
+    def __init__(self, initial=10.0, minimum=2.0, maximum=15.0, factor=4.0, alpha=0.3):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.alpha = alpha
+        self.average = None
+        self._initial = initial
+
+    def observe(self, seconds):
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average = self.alpha * seconds + (1 - self.alpha) * self.average
+
+    @property
+    def timeout(self):
+        if self.average is None:
+            return self._initial
+        return max(self.minimum, min(self.maximum, self.average * self.factor))
+
+
+class PacketWaiter:
+    """
+    事件驱动的数据包等待器：收到第一个数据包就立即返回，
+    并顺带取走同一时刻已到达的其他数据包，不再固定等满超时时间。
+    """
+
+    def __init__(self, listener, adaptive=None, drain_timeout=0.2):
+        self.listener = listener
+        self.adaptive = adaptive or AdaptiveTimeout()
+        self.drain_timeout = drain_timeout
+        self._triggered_at = time.time()
+
+    def mark_triggered(self):
+        """记录触发加载（打开页面、滚动）的时间，用于统计响应耗时"""
+        self._triggered_at = time.time()
+
+    def wait(self):
+        """等待新数据包，超时返回空列表"""
+        timeout = self.adaptive.timeout
+        first = self.listener.wait(timeout=timeout)
+        if not first:
+            print(f"等待 {timeout:.1f} 秒未收到新的数据包")
+            return []
+        self.adaptive.observe(time.time() - self._triggered_at)
+
+        packets = [first]
+        more = self.listener.wait(count=9999, timeout=self.drain_timeout, fit_count=False)
+        if more:
+            packets.extend(more)
+        return packets
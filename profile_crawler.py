@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+from aweme_schema import extract_video, load_body
+from crawl_state import DedupIndex
+from metrics import timed
+from packet_archive import KIND_POST
+from packet_waiter import PacketWaiter
+from rate_limiter import is_throttled_packet, is_verification_page
+
+POST_API = 'aweme/v1/web/aweme/post/'
+# 接口分页时等待每一页响应的超时时间（秒）
+API_PAGE_TIMEOUT = 15
+NO_MORE_XPATH = 'xpath://*[text()="暂时没有更多了"]'
+# 在页面上下文中发起请求，携带页面自己的 Cookie，响应由网络监听捕获
+FETCH_NEXT_PAGE_JS = "fetch(arguments[0], {credentials: 'include'}); return true;"
+
+
+class CrawlSummary:
+    """一次主页采集的统计信息"""
+
+    def __init__(self, mode='full'):
+        self.mode = mode
+        self.pages = 0
+        self.packets = 0
+        self.new_videos = 0
+        self.refreshed_videos = 0
+        self.skipped_videos = 0
+        self.stored_videos = 0
+        self.duplicates_dropped = 0
+        self.duplicates_refreshed = 0
+        self.stop_reason = None
+
+    def to_dict(self):
+        return {
+            'mode': self.mode,
+            'pages': self.pages,
+            'packets': self.packets,
+            'new_videos': self.new_videos,
+            'refreshed_videos': self.refreshed_videos,
+            'skipped_videos': self.skipped_videos,
+            'stored_videos': self.stored_videos,
+            'duplicates_dropped': self.duplicates_dropped,
+            'duplicates_refreshed': self.duplicates_refreshed,
+            'stop_reason': self.stop_reason,
+        }
+
+
+def _process_packet(json_data, state, incremental, summary, index):
+    """
+    解析一个 aweme/post 数据包，返回 (新视频列表, 是否已到达上次采集过的视频)。
+    同一视频在本次采集中只输出一次（index 去重，重复时保留最新的统计数据）；
+    所有视频（包括增量模式下刷新统计的旧视频）都会并入 state，以本次采集的数据为准。
+    """
+    summary.packets += 1
+    new_videos = []
+    reached_known_video = False
+
+    for item in json_data.get('aweme_list') or []:
+        extracted_video = extract_video(item)
+        if extracted_video is None:
+            summary.skipped_videos += 1
+            continue
+        extracted_video, duplicate = index.add(extracted_video)
+        state.add([extracted_video])
+        if duplicate:
+            # 接口分页回退到滚动加载、或滚动触发了重叠的加载时，同一视频会再次出现
+            continue
+        if state.is_known(extracted_video):
+            if incremental:
+                # 已采集过的视频只刷新统计数据，不计入新视频；
+                # 置顶视频总排在最前面，不能作为"到达旧视频"的依据
+                if not extracted_video['is_top']:
+                    reached_known_video = True
+                summary.refreshed_videos += 1
+                continue
+            summary.stored_videos += 1
+        summary.new_videos += 1
+        new_videos.append(extracted_video)
+    summary.duplicates_dropped = index.duplicates
+    summary.duplicates_refreshed = index.refreshed
+    return new_videos, reached_known_video
+
+
+def _next_page_url(template_url, max_cursor):
+    """以页面自己发出的第一页请求为模板，替换 max_cursor 构造下一页地址"""
+    parsed_url = urlparse(template_url)
+    query = [(k, v) for k, v in parse_qsl(parsed_url.query, keep_blank_values=True)
+             if k not in ('max_cursor', 'a_bogus', 'X-Bogus')]
+    # 旧签名只对第一页有效，去掉后由页面内的请求拦截脚本重新签名
+    query.append(('max_cursor', str(max_cursor)))
+    return urlunparse(parsed_url._replace(query=urlencode(query)))
+
+
+def _iter_api_pages(browser, state, incremental, summary, index, capture=None, limiter=None):
+    """
+    接口分页：读取每页返回的 max_cursor / has_more，直接在已加载的页面中请求下一页。
+    正常结束返回 True；接口请求失败时返回 False，由调用方回退到滚动加载。
+    """
+    with timed('packet_wait'):
+        resp = browser.listen.wait(timeout=API_PAGE_TIMEOUT)
+    if not resp:
+        print("未捕捉到第一页接口响应，无法使用接口分页。")
+        return False
+    template_url = resp.url
+
+    while True:
+        summary.pages += 1
+        print(f'\n正在采集第{summary.pages}页的数据（接口分页）')
+        json_data = load_body(resp)
+        if capture:
+            capture.record(KIND_POST, resp)
+        if limiter:
+            limiter.report(resp.url, is_throttled_packet(resp, json_data))
+        if not isinstance(json_data, dict) or 'aweme_list' not in json_data:
+            print(f"接口返回的数据无法识别: {str(json_data)[:200]}")
+            return False
+
+        with timed('extraction'):
+            new_videos, reached_known_video = _process_packet(json_data, state, incremental, summary, index)
+        for video in new_videos:
+            print(f"提取并打印视频 (第{summary.pages}页):  {video['video_title']}")
+            yield video
+
+        if reached_known_video:
+            print("增量模式：已到达上次采集过的视频，停止采集。")
+            summary.stop_reason = 'reached_known'
+            return True
+        if not json_data.get('has_more'):
+            print("接口返回 has_more=0，已采集到最后一页。")
+            summary.stop_reason = 'end_of_list'
+            return True
+
+        next_url = _next_page_url(template_url, json_data.get('max_cursor', 0))
+        if limiter:
+            limiter.acquire(next_url)
+        try:
+            with timed('api_request'):
+                browser.run_js(FETCH_NEXT_PAGE_JS, next_url)
+        except Exception as e:
+            print(f"页面内请求下一页失败: {e}")
+            return False
+        with timed('packet_wait'):
+            resp = browser.listen.wait(timeout=API_PAGE_TIMEOUT)
+        if not resp:
+            print("等待下一页接口响应超时。")
+            return False
+
+
+def _scroll_to_footer(browser, limiter=None):
+    """滚动到主页底部触发下一页加载，找不到底部元素时返回 False"""
+    if limiter:
+        # 滚动会触发下一页的接口请求，同样需要限速
+        limiter.acquire(browser.url)
+    with timed('scroll'):
+        tab = browser.ele('xpath://footer[@class="user-page-footer"]/div[1]')
+        if tab:
+            browser.scroll.to_see(tab)
+            return True
+        return False
+
+
+def _iter_scroll_pages(browser, state, incremental, summary, index, waiter, capture=None, limiter=None):
+    """
+    滚动加载：每次滚动到底部后等待新的数据包，一到达就立即处理。
+    根据数据包中的 has_more 判断是否已到最后一页，只有等不到数据包时才检查页面上的结束文本。
+    """
+    while True:
+        summary.pages += 1
+        print(f'\n正在采集第{summary.pages}页的数据')
+
+        with timed('packet_wait'):
+            all_captured_responses = waiter.wait()
+        if not all_captured_responses:
+            if browser.ele(NO_MORE_XPATH, timeout=0):
+                print("检测到 '暂时没有更多了' 文本，已到底部。")
+                summary.stop_reason = 'end_of_list'
+            else:
+                print("本轮滚动未捕捉到任何新的API响应，可能已到底部或加载失败。停止采集。")
+                summary.stop_reason = 'no_packets'
+            return
+
+        processed_packets_count = 0
+        total_videos_this_round = 0
+        reached_known_video = False
+        has_more = True
+
+        for resp_item in all_captured_responses:
+            try:
+                if POST_API in resp_item.url:
+                    json_data = load_body(resp_item)
+                    if capture:
+                        capture.record(KIND_POST, resp_item)
+                    if limiter:
+                        limiter.report(resp_item.url, is_throttled_packet(resp_item, json_data))
+                    processed_packets_count += 1
+
+                    if json_data.get('has_more') == 0:
+                        has_more = False
+
+                    if not json_data.get('aweme_list'):
+                        summary.packets += 1
+                        print(f"数据包 {processed_packets_count} (URL: {resp_item.url}) 中没有 aweme_list 数据。")
+                        continue
+
+                    with timed('extraction'):
+                        new_videos, reached = _process_packet(json_data, state, incremental, summary, index)
+                    reached_known_video = reached_known_video or reached
+                    # 重复加载的视频同样说明页面还有数据，计入本轮数量以免误判为到底
+                    total_videos_this_round += len(json_data['aweme_list'])
+                    for extracted_video in new_videos:
+                        print(f"提取并打印视频 (数据包 {processed_packets_count}):  {extracted_video['video_title']}")
+                        yield extracted_video
+
+            except Exception as e:
+                print(f"处理数据包 {resp_item.url} 时出错: {e}")
+                continue
+
+        if reached_known_video:
+            print("增量模式：已到达上次采集过的视频，停止采集。")
+            summary.stop_reason = 'reached_known'
+            return
+
+        if not has_more:
+            print("数据包返回 has_more=0，已采集到最后一页。")
+            summary.stop_reason = 'end_of_list'
+            return
+
+        if total_videos_this_round == 0 and processed_packets_count > 0:
+            print(f"本轮捕捉到 {processed_packets_count} 个数据包，但未提取到任何视频，停止采集。")
+            summary.stop_reason = 'no_videos'
+            return
+
+        if not _scroll_to_footer(browser, limiter):
+            print("未找到用于滚动的目标元素，可能页面结构已改变或已到底部。停止采集。")
+            summary.stop_reason = 'no_scroll_target'
+            return
+        waiter.mark_triggered()
+
+
+def iter_profile_videos(browser, page_url, state, incremental=False, summary=None, paging='api', capture=None,
+                        limiter=None):
+    """
+    在已借出的浏览器中采集主页视频的生成器。
+    每解析出一个新视频就立即产出；所有视频（包括增量模式下刷新统计的旧视频）同时并入 state。
+    paging 为 api 时按 max_cursor 直接请求后续页面，失败后回退到滚动加载；为 scroll 时只滚动加载。
+    capture 为 PacketCapture 时录制每个接口数据包；limiter 为 HostRateLimiter 时页面跳转、
+    翻页请求和滚动前先取得限流令牌，并根据响应是否被限流调整速度。
+    """
+    summary = summary or CrawlSummary('incremental' if incremental else 'full')
+    index = DedupIndex()
+    browser.listen.start(POST_API)
+    waiter = PacketWaiter(browser.listen)
+
+    if limiter:
+        limiter.acquire(page_url)
+    with timed('navigation'):
+        browser.get(page_url)
+    print(f"正在访问抖音主页: {browser.url}")
+    if limiter and is_verification_page(browser):
+        limiter.report(page_url, True)
+
+    if paging == 'api':
+        finished = yield from _iter_api_pages(browser, state, incremental, summary, index, capture, limiter)
+        if not finished:
+            print("接口分页失败，回退到滚动加载。")
+            # 已处理过的数据包不会再次出现，先滚动一次触发新的加载
+            if _scroll_to_footer(browser, limiter):
+                waiter.mark_triggered()
+                yield from _iter_scroll_pages(browser, state, incremental, summary, index, waiter, capture, limiter)
+            else:
+                print("未找到用于滚动的目标元素，可能页面结构已改变或已到底部。停止采集。")
+                summary.stop_reason = 'no_scroll_target'
+    else:
+        yield from _iter_scroll_pages(browser, state, incremental, summary, index, waiter, capture, limiter)
+
+    print("\n--- 采集流程结束 ---")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from metrics import timed
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 系统不支持跨进程限流
+    fcntl = None
+
+# 出现这些状态码说明请求过快
+THROTTLE_STATUS_CODES = (403, 429)
+# 跳转到验证码 / 验证中心页面
+VERIFY_URL_RE = re.compile(r'verify|captcha', re.IGNORECASE)
+
+
+class RateLimitTimeout(Exception):
+    """等待令牌超时"""
+
+
+class TokenBucket:
+    """令牌桶：按 rate × factor 的速度补充令牌，最多积攒 burst 个
+
+    factor 是自适应的速度系数：检测到限流时乘以 backoff 并进入冷却期（连续限流时冷却时间指数增长），
+    请求正常时每次增加 recovery，逐步恢复到 1。
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._data = self._initial_state()
+
+    def _initial_state(self):
+        return {'tokens': self.burst, 'updated_at': time.time(), 'factor': 1.0,
+                'strikes': 0, 'cooldown_until': 0.0}
+
+    @contextmanager
+    def _state(self):
+        with self._lock:
+            yield self._data
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state['updated_at'])
+        state['tokens'] = min(self.burst, state['tokens'] + elapsed * self.rate * state['factor'])
+        state['updated_at'] = now
+
+    def try_acquire(self):
+        """取得令牌返回 0，否则返回建议的等待秒数"""
+        now = time.time()
+        with self._state() as state:
+            if state['cooldown_until'] > now:
+                return state['cooldown_until'] - now
+            self._refill(state, now)
+            if state['tokens'] >= 1:
+                state['tokens'] -= 1
+                return 0
+            return (1 - state['tokens']) / (self.rate * state['factor'])
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def throttled(self, backoff=0.5, min_factor=0.05, cooldown=5.0, max_cooldown=300.0):
+        with self._state() as state:
+            state['strikes'] += 1
+            state['factor'] = max(min_factor, state['factor'] * backoff)
+            pause = min(max_cooldown, cooldown * 2 ** (state['strikes'] - 1))
+            state['cooldown_until'] = max(state['cooldown_until'], time.time() + pause)
+            # 冷却期结束后从空桶开始补充，避免立即突发
+            state['tokens'] = 0
+            state['updated_at'] = state['cooldown_until']
+            return state['factor'], pause
+
+    def succeeded(self, recovery=0.05):
+        with self._state() as state:
+            state['strikes'] = 0
+            if state['factor'] < 1.0:
+                state['factor'] = min(1.0, state['factor'] + recovery)
+
+    def factor(self):
+        with self._state() as state:
+            return state['factor']
+
+
+class FileTokenBucket(TokenBucket):
+    """状态保存在文件中、用 flock 加锁的令牌桶，同一台机器上的多个服务进程共享同一个限额"""
+
+    def __init__(self, rate, burst, path):
+        if fcntl is None:
+            raise RuntimeError("跨进程限流需要 fcntl（仅支持 POSIX 系统）")
+        self.path = path
+        super().__init__(rate, burst)
+
+    @contextmanager
+    def _state(self):
+        with self._lock, open(self.path, 'a+', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                try:
+                    state = json.loads(content) if content else self._initial_state()
+                except ValueError:
+                    state = self._initial_state()
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class HostRateLimiter:
+    """按域名限速的令牌桶集合，浏览器页面跳转和页面内接口请求都先在这里取得令牌
+
+    state_dir 不为空时使用文件令牌桶，多个进程共享限额。
+    """
+
+    def __init__(self, rate=2.0, burst=4, state_dir=None, timeout=120, backoff=0.5, min_factor=0.05,
+                 recovery=0.05, cooldown=5.0, max_cooldown=300.0):
+        self.rate = rate
+        self.burst = burst
+        self.state_dir = state_dir
+        self.timeout = timeout
+        self.backoff = backoff
+        self.min_factor = min_factor
+        self.recovery = recovery
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.throttle_events = 0
+        self._buckets = {}
+        self._lock = threading.Lock()
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _bucket(self, url):
+        host = urlparse(url).hostname or url
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                if self.state_dir:
+                    path = os.path.join(self.state_dir, f'{host}.bucket')
+                    bucket = FileTokenBucket(self.rate, self.burst, path)
+                else:
+                    bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url):
+        """等待访问 url 所在域名的令牌，超时抛出 RateLimitTimeout"""
+        if not self.enabled:
+            return
+        with timed('rate_limit_wait'):
+            if not self._bucket(url).acquire(self.timeout):
+                raise RateLimitTimeout(f"等待访问 {urlparse(url).hostname} 的限流令牌超时")
+
+    def report(self, url, throttled):
+        """汇报一次请求的结果：被限流时降速并冷却，正常时逐步恢复"""
+        if not self.enabled:
+            return
+        bucket = self._bucket(url)
+        if throttled:
+            self.throttle_events += 1
+            factor, pause = bucket.throttled(self.backoff, self.min_factor, self.cooldown, self.max_cooldown)
+            print(f"⚠️ 检测到 {urlparse(url).hostname} 限流，速度降为 {factor:.2f} 倍，暂停 {pause:.1f} 秒")
+        else:
+            bucket.succeeded(self.recovery)
+
+    def stats(self):
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {host: round(bucket.factor(), 3) for host, bucket in buckets.items()}
+
+
+def is_throttled_packet(packet, json_data):
+    """接口响应是否表明请求过快：状态码 403/429、空响应体或验证码提示"""
+    status = getattr(packet.response, 'status', None)
+    if status in THROTTLE_STATUS_CODES:
+        return True
+    if not isinstance(json_data, dict):
+        return not json_data or 'verify' in str(json_data)[:500].lower()
+    return bool(json_data.get('verify_check') or json_data.get('captcha'))
+
+
+def is_verification_page(page):
+    """页面是否被重定向到了验证码 / 验证中心"""
+    try:
+        return bool(VERIFY_URL_RE.search(page.url or '')) or '验证' in (page.title or '')
+    except Exception:
+        return False
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# 视频、图片、字体所在的 CDN 域名，整域屏蔽
+MEDIA_HOST_PATTERNS = (
+    '*douyinvod.com*', '*bytevod.com*', '*douyinstatic.com/obj/douyin-pc-web/fonts*',
+)
+IMAGE_HOST_PATTERNS = (
+    '*douyinpic.com*', '*byteimg.com*',
+)
+MEDIA_URL_PATTERNS = ('*.mp4*', '*.m4s*', '*.m4a*', '*.webm*', '*.mp3*')
+FONT_URL_PATTERNS = ('*.woff*', '*.ttf*', '*.otf*')
+IMAGE_URL_PATTERNS = ('*.jpeg*', '*.jpg*', '*.png*', '*.webp*', '*.gif*', '*.avif*', '*.heic*')
+
+# 屏蔽方案：URL 模式（Network.setBlockedURLs）+ 资源类型（Fetch 拦截后直接失败）
+BLOCK_PROFILES = {
+    'off': {
+        'url_patterns': (),
+        'resource_types': (),
+    },
+    'media': {
+        'url_patterns': MEDIA_HOST_PATTERNS + MEDIA_URL_PATTERNS + FONT_URL_PATTERNS,
+        'resource_types': ('Media', 'Font'),
+    },
+    'aggressive': {
+        'url_patterns': MEDIA_HOST_PATTERNS + IMAGE_HOST_PATTERNS + MEDIA_URL_PATTERNS
+                        + FONT_URL_PATTERNS + IMAGE_URL_PATTERNS,
+        'resource_types': ('Media', 'Font', 'Image'),
+    },
+}
+
+
+class ResourceBlocker:
+    """在 CDP 网络层屏蔽图片、视频、字体等资源，只放行页面和接口请求
+
+    allowlist 中的字符串只要出现在请求 URL 或屏蔽模式里，对应的请求就不会被屏蔽，
+    用于放行屏蔽后会导致页面异常的个别资源。
+    """
+
+    def __init__(self, profile='media', allowlist=()):
+        if profile not in BLOCK_PROFILES:
+            raise ValueError(f'unknown block profile: {profile}')
+        self.profile = profile
+        self.allowlist = tuple(a for a in allowlist if a)
+        config = BLOCK_PROFILES[profile]
+        self.url_patterns = [p for p in config['url_patterns'] if not self._allowed(p)]
+        self.resource_types = config['resource_types']
+        self.blocked = 0
+
+    @property
+    def enabled(self):
+        return bool(self.url_patterns or self.resource_types)
+
+    def _allowed(self, text):
+        return any(a in text for a in self.allowlist)
+
+    def apply(self, page):
+        """对一个页面（或标签页）启用屏蔽，每个新标签页都需要单独调用"""
+        if not self.enabled:
+            return
+        try:
+            page.run_cdp('Network.enable')
+            page.run_cdp('Network.setBlockedURLs', urls=self.url_patterns)
+            if self.resource_types:
+                driver = page.driver
+                driver.set_callback('Fetch.requestPaused', lambda **event: self._on_request_paused(driver, **event))
+                page.run_cdp('Fetch.enable', patterns=[
+                    {'resourceType': t, 'requestStage': 'Request'} for t in self.resource_types
+                ])
+            print(f"已启用资源屏蔽方案: {self.profile}")
+        except Exception as e:
+            print(f"启用资源屏蔽失败（忽略）: {e}")
+
+    def _on_request_paused(self, driver, requestId, request, **_):
+        # 在浏览器的事件线程中执行，异常不能向外抛出，否则事件线程会退出
+        try:
+            if self._allowed(request.get('url', '')):
+                driver.run('Fetch.continueRequest', requestId=requestId)
+            else:
+                self.blocked += 1
+                driver.run('Fetch.failRequest', requestId=requestId, errorReason='BlockedByClient')
+        except Exception as e:
+            print(f"处理被拦截的请求时出错: {e}")
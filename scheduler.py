@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from crawl_state import profile_key
+from jobs import JobQueueFull
+
+WATCHLIST_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS watchlist ('
+    'key TEXT PRIMARY KEY, page_url TEXT NOT NULL, interval REAL NOT NULL, priority INTEGER NOT NULL, '
+    'adaptive INTEGER NOT NULL, current_interval REAL NOT NULL, post_interval REAL, '
+    'next_run REAL NOT NULL, last_run REAL, last_new_videos INTEGER, failures INTEGER NOT NULL DEFAULT 0, '
+    'last_error TEXT)'
+)
+WATCHLIST_COLUMNS = (
+    'key', 'page_url', 'interval', 'priority', 'adaptive', 'current_interval', 'post_interval',
+    'next_run', 'last_run', 'last_new_videos', 'failures', 'last_error',
+)
+
+
+class WatchEntry:
+    """监控列表中的一个主页及其调度状态"""
+
+    def __init__(self, key, page_url, interval, priority=0, adaptive=True, current_interval=None,
+                 post_interval=None, next_run=None, last_run=None, last_new_videos=None, failures=0,
+                 last_error=None):
+        self.key = key
+        self.page_url = page_url
+        self.interval = interval
+        self.priority = priority
+        self.adaptive = bool(adaptive)
+        self.current_interval = current_interval or interval
+        # 估算的发布间隔（秒/条），指数加权平均
+        self.post_interval = post_interval
+        self.next_run = next_run
+        self.last_run = last_run
+        self.last_new_videos = last_new_videos
+        self.failures = failures
+        self.last_error = last_error
+
+    def to_row(self):
+        return tuple(getattr(self, name) for name in WATCHLIST_COLUMNS)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in WATCHLIST_COLUMNS}
+
+
+class Watchlist:
+    """保存在 SQLite 中的监控列表"""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(WATCHLIST_SCHEMA)
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            rows = self._db.execute(f'SELECT {", ".join(WATCHLIST_COLUMNS)} FROM watchlist').fetchall()
+        return [WatchEntry(*row) for row in rows]
+
+    def save(self, entry):
+        placeholders = ', '.join('?' for _ in WATCHLIST_COLUMNS)
+        with self._lock:
+            self._db.execute(
+                f'INSERT OR REPLACE INTO watchlist ({", ".join(WATCHLIST_COLUMNS)}) VALUES ({placeholders})',
+                entry.to_row(),
+            )
+            self._db.commit()
+
+    def remove(self, key):
+        with self._lock:
+            self._db.execute('DELETE FROM watchlist WHERE key = ?', (key,))
+            self._db.commit()
+
+
+class CrawlScheduler:
+    """
+    定时重新采集监控列表中的主页。
+
+    - 新加入的主页在一个间隔内随机错开首次采集时间，每次排期再叠加 ±jitter 的随机抖动，避免集中触发；
+    - 同时进行的采集不超过 max_concurrent（应小于浏览器池大小），到期的主页按优先级先后提交；
+    - adaptive 为 True 的主页按实际发布频率调整间隔：发现新视频时向"平均多久发一条"靠拢，
+      没有新视频时逐步放宽，范围限制在 [min_interval, max_interval]。
+    """
+
+    def __init__(self, submit, watchlist, max_concurrent=2, jitter=0.1, min_interval=600,
+                 max_interval=86400, tick=1.0, backoff_factor=1.5, retry_base=60):
+        self.submit = submit
+        self.watchlist = watchlist
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.jitter = jitter
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.tick = tick
+        self.backoff_factor = backoff_factor
+        self.retry_base = retry_base
+        self.dispatched = 0
+        self._entries = {entry.key: entry for entry in watchlist.load()}
+        self._running = {}  # key -> Job
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, name='crawl-scheduler', daemon=True)
+        self._thread.start()
+        print(f"✅ 定时采集已启动: 监控 {len(self._entries)} 个主页，最多同时采集 {self.max_concurrent} 个")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _jittered(self, seconds):
+        return seconds * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def watch(self, page_url, interval, priority=0, adaptive=True):
+        """加入或更新监控的主页，返回其调度信息"""
+        key = profile_key(page_url)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = WatchEntry(key, page_url, interval, priority, adaptive)
+                # 首次采集在一个间隔内随机错开
+                entry.next_run = now + random.uniform(0, min(interval, self.max_interval))
+                self._entries[key] = entry
+            else:
+                entry.page_url = page_url
+                entry.priority = priority
+                entry.adaptive = bool(adaptive)
+                if interval != entry.interval:
+                    entry.interval = entry.current_interval = interval
+                    entry.next_run = min(entry.next_run, now + self._jittered(interval))
+            self.watchlist.save(entry)
+            return entry.to_dict()
+
+    def unwatch(self, key):
+        with self._lock:
+            removed = self._entries.pop(key, None)
+        if removed:
+            self.watchlist.remove(key)
+        return removed is not None
+
+    def entries(self):
+        with self._lock:
+            return sorted((entry.to_dict() for entry in self._entries.values()), key=lambda e: e['next_run'])
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._collect_finished()
+                self._dispatch_due()
+            except Exception as e:
+                print(f"定时采集调度出错: {e}")
+            self._stop.wait(self.tick)
+
+    def _collect_finished(self):
+        now = time.time()
+        with self._lock:
+            for key, job in list(self._running.items()):
+                if job.status not in ('done', 'failed'):
+                    continue
+                del self._running[key]
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if job.status == 'done':
+                    self._reschedule(entry, job.progress.get('new_videos', 0), now)
+                else:
+                    entry.failures += 1
+                    entry.last_error = job.error
+                    # 失败后按指数退避重试，但不晚于正常间隔
+                    retry = min(entry.current_interval, self.retry_base * 2 ** (entry.failures - 1))
+                    entry.next_run = now + self._jittered(retry)
+                self.watchlist.save(entry)
+
+    def _reschedule(self, entry, new_videos, now):
+        if entry.adaptive:
+            if new_videos and entry.last_run:
+                observed = (now - entry.last_run) / new_videos
+                entry.post_interval = observed if entry.post_interval is None \
+                    else 0.5 * observed + 0.5 * entry.post_interval
+                target = entry.post_interval
+            else:
+                target = entry.current_interval * self.backoff_factor
+            entry.current_interval = max(self.min_interval, min(self.max_interval, target))
+        else:
+            entry.current_interval = entry.interval
+        entry.last_run = now
+        entry.last_new_videos = new_videos
+        entry.failures = 0
+        entry.last_error = None
+        entry.next_run = now + self._jittered(entry.current_interval)
+
+    def _dispatch_due(self):
+        now = time.time()
+        with self._lock:
+            free = self.max_concurrent - len(self._running)
+            if free <= 0:
+                return
+            due = [entry for entry in self._entries.values()
+                   if entry.next_run <= now and entry.key not in self._running]
+            # 优先级高的先提交，同优先级按到期先后
+            due.sort(key=lambda entry: (-entry.priority, entry.next_run))
+            for entry in due[:free]:
+                try:
+                    job = self.submit(entry.page_url)
+                except JobQueueFull:
+                    print("任务队列已满，稍后再提交定时采集")
+                    return
+                self._running[entry.key] = job
+                self.dispatched += 1
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                'watched': len(self._entries),
+                'running': len(self._running),
+                'due': sum(1 for entry in self._entries.values() if entry.next_run <= now),
+                'max_concurrent': self.max_concurrent,
+                'dispatched': self.dispatched,
+            }
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class NoSessionAvailable(RuntimeError):
+    """所有登录会话都处于隔离期"""
+
+
+class LoginSession:
+    """一个登录会话：login.py 登录后的用户资料目录，或导出的 Cookie 文件（JSON 列表）
+
+    浏览器启动时绑定一个会话，之后该浏览器上的请求结果都计入这个会话的健康状态。
+    """
+
+    def __init__(self, name, profile_dir=None, cookies_file=None):
+        self.name = name
+        self.profile_dir = profile_dir
+        self.cookies_file = cookies_file
+        self.browsers = 0       # 当前绑定的浏览器数量
+        self.launches = 0
+        self.successes = 0
+        self.failures = 0
+        self.verifications = 0
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+        self.last_used = 0.0
+        self.last_error = None
+        self.recent_failures = deque()  # 最近失败的时间戳
+
+    def load_cookies(self):
+        with open(self.cookies_file, encoding='utf-8') as f:
+            data = json.load(f)
+        # 兼容 {"cookies": [...]} 格式的导出文件
+        return data.get('cookies', []) if isinstance(data, dict) else data
+
+    def is_quarantined(self, now=None):
+        return self.quarantined_until > (now or time.time())
+
+    def to_dict(self, now=None):
+        now = now or time.time()
+        return {
+            'name': self.name,
+            'source': self.profile_dir or self.cookies_file,
+            'browsers': self.browsers,
+            'launches': self.launches,
+            'successes': self.successes,
+            'failures': self.failures,
+            'recent_failures': len(self.recent_failures),
+            'verifications': self.verifications,
+            'quarantines': self.quarantines,
+            'quarantined': self.is_quarantined(now),
+            'quarantine_remaining': max(0.0, round(self.quarantined_until - now, 1)),
+            'last_error': self.last_error,
+        }
+
+
+def load_sessions(sources, default_profile_dir):
+    """
+    由配置生成会话列表。sources 中每一项可以是：
+    - 用户资料目录（login.py 登录后生成）；
+    - Cookie 文件（*.json）；
+    - 包含多个用户资料目录 / Cookie 文件的目录（其中没有 Default 子目录时按此处理）。
+    没有配置时只使用 default_profile_dir 一个会话。
+    """
+    sessions = []
+
+    def _add(path):
+        name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        if path.endswith('.json'):
+            sessions.append(LoginSession(name, cookies_file=path))
+        else:
+            sessions.append(LoginSession(name, profile_dir=path))
+
+    for source in sources:
+        source = os.path.expanduser(source.strip())
+        if not source:
+            continue
+        if not os.path.exists(source):
+            print(f"⚠️ 登录会话不存在，跳过: {source}")
+            continue
+        if os.path.isdir(source) and not os.path.isdir(os.path.join(source, 'Default')):
+            children = sorted(os.listdir(source))
+            for child in children:
+                path = os.path.join(source, child)
+                if child.endswith('.json') or os.path.isdir(os.path.join(path, 'Default')):
+                    _add(path)
+            continue
+        _add(source)
+
+    if not sessions:
+        sessions.append(LoginSession('default', profile_dir=default_profile_dir))
+    # 名称重复时加上序号，保证在接口和指标中可以区分
+    seen = {}
+    for session in sessions:
+        count = seen.get(session.name, 0)
+        seen[session.name] = count + 1
+        if count:
+            session.name = f'{session.name}-{count + 1}'
+    return sessions
+
+
+class SessionPool:
+    """
+    多个登录会话在浏览器之间轮换，并跟踪每个会话的健康状态。
+
+    - 新浏览器启动时选择绑定浏览器最少、最久未使用的健康会话，负载分散到所有账号上；
+    - 请求成功、失败、出现验证码都通过 report() 计入会话；failure_window 秒内失败达到
+      max_failures 次或出现验证码时隔离该会话，隔离时间随连续隔离次数翻倍（不超过 max_quarantine）；
+    - 被隔离会话的浏览器在归还时回收（retire），重新启动的浏览器换用其他会话；
+      隔离期结束后会话重新参与轮换，再次成功后隔离时长复位。
+    """
+
+    def __init__(self, sessions, max_failures=3, failure_window=600, quarantine=1800, max_quarantine=6 * 3600):
+        if not sessions:
+            raise ValueError("至少需要一个登录会话")
+        self.sessions = list(sessions)
+        self.max_failures = max(1, int(max_failures))
+        self.failure_window = failure_window
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+        self._bound = {}  # 浏览器调试地址 -> 会话
+        self._lock = threading.Lock()
+
+    def checkout(self):
+        """为即将启动的浏览器选择一个会话"""
+        now = time.time()
+        with self._lock:
+            healthy = [s for s in self.sessions if not s.is_quarantined(now)]
+            if not healthy:
+                soonest = min(self.sessions, key=lambda s: s.quarantined_until)
+                raise NoSessionAvailable(
+                    f"所有登录会话都在隔离中，最早 {soonest.quarantined_until - now:.0f} 秒后恢复（{soonest.name}）"
+                )
+            session = min(healthy, key=lambda s: (s.browsers, s.last_used))
+            session.browsers += 1
+            session.launches += 1
+            session.last_used = now
+            return session
+
+    def bind(self, address, session):
+        """记录浏览器（按调试地址区分）使用的会话"""
+        with self._lock:
+            self._bound[address] = session
+
+    def release(self, address=None, session=None):
+        """浏览器关闭或启动失败后解除绑定"""
+        with self._lock:
+            session = self._bound.pop(address, None) or session
+            if session is not None:
+                session.browsers = max(0, session.browsers - 1)
+
+    def session_for(self, page):
+        """页面（或标签页）所属浏览器绑定的会话"""
+        address = _browser_address(page)
+        with self._lock:
+            return self._bound.get(address)
+
+    def apply_cookies(self, page):
+        """Cookie 会话的浏览器启动后写入 Cookie（用户资料会话无需处理）"""
+        session = self.session_for(page)
+        if session is None or not session.cookies_file:
+            return
+        try:
+            page.set.cookies(session.load_cookies())
+        except Exception as e:
+            # 文件损坏、Cookie 格式不对或 CDP 调用失败都计为会话失败，由浏览器池关闭这个浏览器
+            print(f"设置会话 {session.name} 的 Cookie 失败: {e}")
+            self.report(page, False, error=f'Cookie 加载失败: {e}')
+            raise
+
+    def report(self, page, ok, verification=False, error=None):
+        """汇报一次请求的结果，verification 表示被要求验证（验证码 / 登录）"""
+        session = self.session_for(page)
+        if session is None:
+            return
+        now = time.time()
+        with self._lock:
+            if ok and not verification:
+                session.successes += 1
+                session.recent_failures.clear()
+                # 隔离结束后首次成功，隔离时长从头计算
+                if not session.is_quarantined(now):
+                    session.quarantines = 0
+                return
+            session.failures += 1
+            session.last_error = error or ('出现验证码' if verification else None)
+            session.recent_failures.append(now)
+            while session.recent_failures and session.recent_failures[0] < now - self.failure_window:
+                session.recent_failures.popleft()
+            if verification:
+                session.verifications += 1
+            if verification or len(session.recent_failures) >= self.max_failures:
+                self._quarantine(session, now)
+
+    def _quarantine(self, session, now):
+        if session.is_quarantined(now):
+            return
+        pause = min(self.max_quarantine, self.quarantine * 2 ** session.quarantines)
+        session.quarantines += 1
+        session.quarantined_until = now + pause
+        session.recent_failures.clear()
+        print(f"⚠️ 登录会话 {session.name} 已隔离 {pause:.0f} 秒: {session.last_error}")
+
+    def should_retire(self, page):
+        """浏览器绑定的会话已被隔离时，归还后应关闭该浏览器"""
+        session = self.session_for(page)
+        return session is not None and session.is_quarantined()
+
+    def release_quarantine(self, name):
+        """手动解除隔离，返回是否找到该会话"""
+        with self._lock:
+            for session in self.sessions:
+                if session.name == name:
+                    session.quarantined_until = 0.0
+                    session.recent_failures.clear()
+                    return True
+        return False
+
+    def entries(self):
+        now = time.time()
+        with self._lock:
+            return [session.to_dict(now) for session in self.sessions]
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            quarantined = sum(1 for s in self.sessions if s.is_quarantined(now))
+            return {
+                'total': len(self.sessions),
+                'healthy': len(self.sessions) - quarantined,
+                'quarantined': quarantined,
+                'bound_browsers': len(self._bound),
+            }
+
+
+def _browser_address(page):
+    """页面所属浏览器的调试地址（标签页与其浏览器相同）"""
+    browser = getattr(page, 'browser', None)
+    return getattr(browser, 'address', None) or getattr(page, 'address', None)
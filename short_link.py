@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+from urllib.parse import urlparse, parse_qs, urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import THROTTLE_STATUS_CODES, RateLimitTimeout
+
+# 详情页路径中的视频ID，例如 douyin.com/video/<id>、iesdouyin.com/share/video/<id>/
+VIDEO_PATH_RE = re.compile(r'/(?:video|note)/(\d+)')
+# 分享文本中的第一个链接
+URL_RE = re.compile(r'https?://[^\s，。]+')
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+def find_url(text):
+    """从分享文本中提取链接，文本本身就是链接时原样返回"""
+    match = URL_RE.search(text)
+    return match.group(0) if match else text
+
+
+def extract_video_id(url):
+    """从抖音链接中提取视频ID，无法识别时返回 None"""
+    parsed_url = urlparse(url)
+    query_params = parse_qs(parsed_url.query)
+    for key in ('vid', 'modal_id'):
+        if query_params.get(key) and query_params[key][0].isdigit():
+            return query_params[key][0]
+    match = VIDEO_PATH_RE.search(parsed_url.path)
+    if match:
+        return match.group(1)
+    return None
+
+
+class ShortLinkResolver:
+    """通过普通 HTTP 请求跟随 v.douyin.com 短链跳转，提取视频ID
+
+    只读取每一跳的 Location 头，不下载页面内容，也不需要启动浏览器。
+    指定 rate_limiter 时每一跳请求前先取得限流令牌。
+    """
+
+    def __init__(self, max_hops=5, timeout=5, pool_size=10, user_agent=None, rate_limiter=None):
+        self.max_hops = max_hops
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+
+    def resolve(self, url):
+        """返回视频ID；解析失败返回 None，由调用方回退到浏览器跳转"""
+        url = find_url(url)
+        video_id = extract_video_id(url)
+        if video_id:
+            # 已经是标准详情页链接，无需解析
+            return video_id
+
+        current_url = url
+        for _ in range(self.max_hops):
+            try:
+                if self.rate_limiter:
+                    self.rate_limiter.acquire(current_url)
+                resp = self.session.get(current_url, allow_redirects=False, timeout=self.timeout, stream=True)
+                resp.close()
+            except (requests.RequestException, RateLimitTimeout) as e:
+                print(f"HTTP 解析短链出错: {e}")
+                return None
+            if self.rate_limiter:
+                self.rate_limiter.report(current_url, resp.status_code in THROTTLE_STATUS_CODES)
+
+            if resp.status_code not in REDIRECT_CODES or 'Location' not in resp.headers:
+                break
+
+            current_url = urljoin(current_url, resp.headers['Location'])
+            print(f"短链跳转: {current_url}")
+            video_id = extract_video_id(current_url)
+            if video_id:
+                return video_id
+
+        print(f"HTTP 解析未能得到视频ID，最终URL: {current_url}")
+        return None
@@ -8,76 +8,14 @@ import subprocess
 import signal
 from DrissionPage import ChromiumPage, ChromiumOptions # 修改：从 ChromiumPage 导入，而不是 Chromium
 import DrissionPage # 导入用于获取版本号
-
-# --- 你提供的 XvfbManager 类 ---
-class XvfbManager:
-    """Xvfb虚拟显示器管理器"""
-
-    def __init__(self, display=':99', screen='0', resolution='1920x1080x24'):
-        self.display = display
-        self.screen = screen
-        self.resolution = resolution
-        self.xvfb_process = None
-
-    def start(self):
-        """启动Xvfb虚拟显示器"""
-        try:
-            # 清理可能存在的Xvfb进程
-            self.cleanup()
-
-            print(f"启动Xvfb虚拟显示器: DISPLAY={self.display}")
-
-            # 启动Xvfb，加上了GLX扩展，这可能是之前成功的关键
-            cmd = ['Xvfb', self.display, '-screen', self.screen, self.resolution, '-ac', '+extension', 'GLX']
-            self.xvfb_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.PIPE
-            )
-
-            # 设置环境变量
-            os.environ['DISPLAY'] = self.display
-
-            # 等待Xvfb启动
-            time.sleep(3)
-
-            # 检查Xvfb是否正常运行
-            if self.xvfb_process.poll() is None:
-                print(f"✅ Xvfb启动成功，DISPLAY={self.display}")
-                return True
-            else:
-                stderr_output = self.xvfb_process.stderr.read().decode()
-                print(f"❌ Xvfb启动失败: {stderr_output}")
-                return False
-
-        except Exception as e:
-            print(f"❌ 启动Xvfb时出错: {e}")
-            return False
-
-    def stop(self):
-        """停止Xvfb"""
-        if self.xvfb_process and self.xvfb_process.poll() is None:
-            print("停止Xvfb进程...")
-            self.xvfb_process.terminate()
-            try:
-                self.xvfb_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.xvfb_process.kill()
-
-    def cleanup(self):
-        """清理残留的Xvfb进程"""
-        try:
-            subprocess.run(['pkill', '-f', f'Xvfb.*{self.display}'],
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL)
-            time.sleep(1)
-        except:
-            pass
+from xvfb_pool import DisplayPool
 
 # --- 你提供的 create_chrome_options 函数，并加入 Accept-Language 设置 ---
-def create_chrome_options():
+def create_chrome_options(display=None):
     """创建Chrome选项配置"""
     options = ChromiumOptions()
+    if display:
+        options.set_argument('--display', display) # 只对这个浏览器生效的 Xvfb 显示器
 
     # 基础选项（保留有助于稳定性和反检测的）
     options.set_argument('--no-sandbox')
@@ -104,7 +42,7 @@ def create_chrome_options():
 # --- 你提供的 test_douyin_page 函数，并加入 httpbin.org 验证和截图清除 ---
 def test_douyin_page():
     """测试访问抖音页面并截图"""
-    xvfb = None # 使用你自己的 XvfbManager 实例
+    xvfb = None # 共享的 Xvfb 显示器池
     page = None
 
     try:
@@ -113,14 +51,14 @@ def test_douyin_page():
         print("="*50)
 
         # 1. 启动Xvfb
-        xvfb = XvfbManager() # 使用你自己的 XvfbManager 类
+        xvfb = DisplayPool(size=1) # 使用共享的 Xvfb 显示器池
         if not xvfb.start():
             print("❌ Xvfb启动失败，退出测试")
             return False
 
         # 2. 创建浏览器实例
         print("\n🚀 创建浏览器实例...")
-        options = create_chrome_options()
+        options = create_chrome_options(display=xvfb.acquire())
         # 注意：这里 DrissionPage 的使用方式，以前用 Chromium，现在用 ChromiumPage
         # 如果你希望用 browser.latest_tab，则应该实例化 Chromium
         # 根据你的原始代码片段，你用的是 page = browser.latest_tab，所以这里应该实例化 Chromium
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+# 播放地址中表示过期时间的查询参数
+EXPIRY_QUERY_KEYS = ('x-expires', 'expires', 'expire')
+# douyinvod 等 CDN 地址形如 /<签名>/<十六进制过期时间>/video/...
+HEX_EXPIRY_RE = re.compile(r'/[0-9a-f]{32}/([0-9a-f]{8})/')
+
+
+def parse_url_expiry(url):
+    """从播放地址中解析过期时间戳（秒），没有时返回 None"""
+    parsed_url = urlparse(url)
+    query_params = parse_qs(parsed_url.query)
+    for key in EXPIRY_QUERY_KEYS:
+        value = query_params.get(key, [''])[0]
+        if value.isdigit():
+            return int(value)
+    match = HEX_EXPIRY_RE.search(parsed_url.path)
+    if match:
+        timestamp = int(match.group(1), 16)
+        # 只接受看起来像合理时间戳的值，避免把普通十六进制串误判为过期时间
+        if abs(timestamp - time.time()) < 30 * 24 * 3600:
+            return timestamp
+    return None
+
+
+class VideoUrlCache:
+    """按视频ID缓存下载地址的 LRU + TTL 缓存
+
+    过期时间取默认 TTL 与播放地址自带过期时间中较早的一个；
+    指定 db_path 时同时写入 SQLite，服务重启后仍可命中。
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600, expiry_margin=60, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.expiry_margin = expiry_margin
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # video_id -> (video_url, expires_at)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS video_urls ('
+                'video_id TEXT PRIMARY KEY, video_url TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.execute('DELETE FROM video_urls WHERE expires_at <= ?', (time.time(),))
+            self._db.commit()
+
+    def _expires_at(self, video_url):
+        now = time.time()
+        expires_at = now + self.ttl
+        url_expiry = parse_url_expiry(video_url)
+        if url_expiry is not None:
+            expires_at = min(expires_at, url_expiry - self.expiry_margin)
+        return expires_at
+
+    def get(self, video_id):
+        """返回未过期的下载地址，未命中返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    'SELECT video_url, expires_at FROM video_urls WHERE video_id = ?', (video_id,)
+                ).fetchone()
+                if row:
+                    entry = (row[0], row[1])
+                    self._store(video_id, entry)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(video_id)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(video_id)
+            self.misses += 1
+            return None
+
+    def put(self, video_id, video_url):
+        """写入下载地址，地址已过期或即将过期时不缓存"""
+        expires_at = self._expires_at(video_url)
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            self._store(video_id, (video_url, expires_at))
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO video_urls (video_id, video_url, expires_at) VALUES (?, ?, ?)',
+                    (video_id, video_url, expires_at),
+                )
+                self._db.commit()
+
+    def _store(self, video_id, entry):
+        self._entries[video_id] = entry
+        self._entries.move_to_end(video_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _remove(self, video_id):
+        self._entries.pop(video_id, None)
+        if self._db is not None:
+            self._db.execute('DELETE FROM video_urls WHERE video_id = ?', (video_id,))
+            self._db.commit()
+
+    def stats(self):
+        """返回命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
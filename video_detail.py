@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from aweme_schema import extract_detail
+
+
+def parse_detail_video_url(json_data):
+    """从 aweme/detail 接口返回的数据中取出无水印播放地址"""
+    video_url = extract_detail(json_data)['video_url']
+    if not video_url:
+        raise Exception("未找到视频播放地址 (url_list)。")
+    return video_url
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv
+import io
+import json
+import zlib
+
+from aweme_schema import VIDEO_FIELDS
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # 只有导出 Parquet / Arrow 时才需要
+    pyarrow = None
+
+COLUMNS = tuple(field.name for field in VIDEO_FIELDS)
+# 每攒够这么多行输出一块，避免逐行产出过多的小块
+CHUNK_ROWS = 500
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),  # Flask 会为 text/* 加上 charset=utf-8
+    'ndjson': ('application/gzip', 'ndjson.gz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+def iter_csv(videos):
+    """逐块产出 CSV 文本，带 BOM 以便 Excel 正确识别中文"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(COLUMNS)
+    for i, video in enumerate(videos, 1):
+        writer.writerow([video[name] for name in COLUMNS])
+        if i % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson_gz(videos):
+    """逐块产出 gzip 压缩的 NDJSON"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 输出 gzip 格式
+    lines = []
+    for video in videos:
+        lines.append(json.dumps(video.to_dict(), ensure_ascii=False))
+        if len(lines) >= CHUNK_ROWS:
+            chunk = compressor.compress(('\n'.join(lines) + '\n').encode('utf-8'))
+            lines = []
+            if chunk:
+                yield chunk
+    if lines:
+        yield compressor.compress(('\n'.join(lines) + '\n').encode('utf-8'))
+    yield compressor.flush()
+
+
+def to_columns(videos):
+    """把记录转换为按列存放的 dict，供 Arrow 构建列式表"""
+    columns = {name: [] for name in COLUMNS}
+    appends = [(columns[name].append, name) for name in COLUMNS]
+    for video in videos:
+        for append, name in appends:
+            append(video[name])
+    return columns
+
+
+def to_arrow_table(videos):
+    if pyarrow is None:
+        raise RuntimeError("导出 Parquet / Arrow 需要安装 pyarrow")
+    return pyarrow.table(to_columns(videos))
+
+
+def export_parquet(videos):
+    """返回 Parquet 文件内容（Parquet 的文件尾需要全部数据写完后才能生成，无法边写边发送）"""
+    table = to_arrow_table(videos)
+    buffer = io.BytesIO()
+    pyarrow.parquet.write_table(table, buffer, compression='zstd')
+    return buffer.getvalue()
+
+
+def export_arrow(videos):
+    """返回 Arrow IPC 流格式的内容"""
+    table = to_arrow_table(videos)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=CHUNK_ROWS * 10)
+    return sink.getvalue().to_pybytes()
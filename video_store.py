@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS videos ('
+    'aweme_id TEXT PRIMARY KEY, profile TEXT NOT NULL, video_url TEXT, title TEXT, '
+    'create_time INTEGER, duration INTEGER, download_url TEXT, is_top INTEGER, '
+    'digg_count INTEGER, comment_count INTEGER, collect_count INTEGER, share_count INTEGER, '
+    'first_seen REAL NOT NULL, last_seen REAL NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS snapshots ('
+    'aweme_id TEXT NOT NULL, profile TEXT NOT NULL, captured_at REAL NOT NULL, '
+    'digg_count INTEGER, comment_count INTEGER, collect_count INTEGER, share_count INTEGER, '
+    'PRIMARY KEY (aweme_id, captured_at))',
+    'CREATE INDEX IF NOT EXISTS idx_videos_profile_create_time ON videos (profile, create_time DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_videos_create_time ON videos (create_time DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_snapshots_profile_captured_at ON snapshots (profile, captured_at)',
+)
+
+UPSERT_VIDEO_SQL = (
+    'INSERT INTO videos (aweme_id, profile, video_url, title, create_time, duration, download_url, is_top, '
+    'digg_count, comment_count, collect_count, share_count, first_seen, last_seen) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+    'ON CONFLICT (aweme_id) DO UPDATE SET profile = excluded.profile, video_url = excluded.video_url, '
+    'title = excluded.title, create_time = excluded.create_time, duration = excluded.duration, '
+    'download_url = excluded.download_url, is_top = excluded.is_top, digg_count = excluded.digg_count, '
+    'comment_count = excluded.comment_count, collect_count = excluded.collect_count, '
+    'share_count = excluded.share_count, last_seen = excluded.last_seen '
+    'WHERE excluded.last_seen >= videos.last_seen'
+)
+INSERT_SNAPSHOT_SQL = (
+    'INSERT OR REPLACE INTO snapshots (aweme_id, profile, captured_at, '
+    'digg_count, comment_count, collect_count, share_count) VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+
+# 排行榜可用的指标（接口参数 -> 列名）
+METRICS = {
+    'like': 'digg_count',
+    'comment': 'comment_count',
+    'collect': 'collect_count',
+    'share': 'share_count',
+    'create_time': 'create_time',
+}
+
+SNAPSHOT_METRICS = ('digg_count', 'comment_count', 'collect_count', 'share_count')
+
+VIDEO_COLUMNS = (
+    'aweme_id, profile, video_url, title, create_time, duration, download_url, is_top, '
+    'digg_count, comment_count, collect_count, share_count, first_seen, last_seen'
+)
+
+
+class VideoStore:
+    """把每次采集到的视频和统计快照保存到 SQLite（WAL 模式）
+
+    写入由后台线程批量完成，采集线程只把数据放进队列；
+    读取在各自线程的只读连接上进行，WAL 模式下不会被写入阻塞。
+    """
+
+    def __init__(self, db_path, batch_size=500, flush_interval=1.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written_videos = 0
+        self.written_snapshots = 0
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._closed = False
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._writer_db = self._connect()
+        self._writer_db.execute('PRAGMA journal_mode=WAL')
+        for statement in SCHEMA:
+            self._writer_db.execute(statement)
+        self._writer_db.commit()
+        self._writer = threading.Thread(target=self._write_loop, name='video-store-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _reader(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def add(self, profile, videos, captured_at=None):
+        """把一次采集到的视频放入写入队列，同一次采集的快照使用同一个时间戳"""
+        captured_at = captured_at or time.time()
+        for video in videos:
+            self._queue.put((profile, captured_at, video))
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    # 先写完已取出的数据，再把结束标记放回
+                    self._queue.task_done()
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            except sqlite3.Error as e:
+                print(f"写入视频数据库失败: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch):
+        video_rows = []
+        snapshot_rows = []
+        for profile, captured_at, video in batch:
+            video_rows.append((
+                video['video_id'], profile, video['video_url'], video['video_title'], video['create_time'],
+                video['video_duration'], video['video_download_url'], int(bool(video['is_top'])),
+                video['video_like'], video['video_comment'], video['video_collect'], video['video_share'],
+                captured_at, captured_at,
+            ))
+            snapshot_rows.append((
+                video['video_id'], profile, captured_at,
+                video['video_like'], video['video_comment'], video['video_collect'], video['video_share'],
+            ))
+        with self._writer_db:
+            self._writer_db.executemany(UPSERT_VIDEO_SQL, video_rows)
+            self._writer_db.executemany(INSERT_SNAPSHOT_SQL, snapshot_rows)
+        self.written_videos += len(video_rows)
+        self.written_snapshots += len(snapshot_rows)
+
+    def flush(self):
+        """等待队列中的数据全部写入"""
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=30)
+        self._writer_db.close()
+
+    def profile_videos(self, profile, limit=100, offset=0):
+        """主页的视频，按发布时间倒序"""
+        rows = self._reader().execute(
+            f'SELECT {VIDEO_COLUMNS} FROM videos WHERE profile = ? ORDER BY create_time DESC LIMIT ? OFFSET ?',
+            (profile, limit, offset),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def profile_history(self, profile, since=None, until=None):
+        """
+        主页每次采集时的视频数和统计数据合计，按采集时间排序。
+
+        增量采集只保存本次采集到的视频的快照，所以合计不能只加本次的快照：
+        每个采集时间点使用每个视频截至当时的最新快照，crawled 为本次采集实际采集到的视频数。
+        """
+        since = since or 0
+        rows = self._reader().execute(
+            'SELECT aweme_id, captured_at, digg_count, comment_count, collect_count, share_count '
+            'FROM snapshots WHERE profile = ? AND captured_at <= ? ORDER BY captured_at',
+            (profile, until or time.time()),
+        ).fetchall()
+        latest = {}  # aweme_id -> 最新快照的统计数据
+        totals = dict.fromkeys(SNAPSHOT_METRICS, 0)
+        history = []
+        crawled = 0
+        for i, row in enumerate(rows):
+            previous = latest.get(row['aweme_id'])
+            for name in SNAPSHOT_METRICS:
+                totals[name] += (row[name] or 0) - (previous[name] if previous else 0)
+            latest[row['aweme_id']] = {name: row[name] or 0 for name in SNAPSHOT_METRICS}
+            crawled = crawled + 1 if i and rows[i - 1]['captured_at'] == row['captured_at'] else 1
+            # 同一次采集的最后一条快照之后输出该时间点的合计
+            last_of_capture = i + 1 == len(rows) or rows[i + 1]['captured_at'] != row['captured_at']
+            if last_of_capture and row['captured_at'] >= since:
+                history.append({'captured_at': row['captured_at'], 'videos': len(latest), 'crawled': crawled,
+                                **totals})
+        return history
+
+    def video_history(self, aweme_id):
+        """单个视频的统计数据快照，按采集时间排序"""
+        rows = self._reader().execute(
+            'SELECT captured_at, digg_count, comment_count, collect_count, share_count '
+            'FROM snapshots WHERE aweme_id = ? ORDER BY captured_at',
+            (aweme_id,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def download_url(self, aweme_id):
+        """最近一次采集到的视频下载地址，没有时返回 None"""
+        row = self._reader().execute('SELECT download_url FROM videos WHERE aweme_id = ?', (aweme_id,)).fetchone()
+        return row['download_url'] if row else None
+
+    def top_videos(self, metric='like', limit=10, profile=None):
+        """按指标排序的前 N 个视频，profile 为空时在全部视频中排序"""
+        column = METRICS[metric]
+        if profile:
+            sql = f'SELECT {VIDEO_COLUMNS} FROM videos WHERE profile = ? ORDER BY {column} DESC LIMIT ?'
+            params = (profile, limit)
+        else:
+            sql = f'SELECT {VIDEO_COLUMNS} FROM videos ORDER BY {column} DESC LIMIT ?'
+            params = (limit,)
+        return [dict(row) for row in self._reader().execute(sql, params).fetchall()]
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written_videos': self.written_videos,
+            'written_snapshots': self.written_snapshots,
+        }
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import subprocess
+import threading
+import time
+
+X11_SOCKET_DIR = '/tmp/.X11-unix'
+
+
+class XvfbDisplay:
+    """一个 Xvfb 虚拟显示器进程"""
+
+    def __init__(self, number, process):
+        self.number = number
+        self.process = process
+        self.users = 0
+
+    @property
+    def name(self):
+        return f':{self.number}'
+
+
+class DisplayPool:
+    """Xvfb 虚拟显示器池
+
+    启动若干个显示器，通过探测 X socket 确认就绪，不再固定 sleep；
+    每个浏览器通过 acquire() 分到一个显示器，并用 --display 参数传给该浏览器，
+    不修改全局的 DISPLAY 环境变量。
+    """
+
+    def __init__(self, size=1, base_display=99, screen='0', resolution='1920x1080x24', ready_timeout=10):
+        self.size = max(1, int(size))
+        self.base_display = base_display
+        self.screen = screen
+        self.resolution = resolution
+        self.ready_timeout = ready_timeout
+        self.displays = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """启动全部显示器，任何一个启动失败都返回 False"""
+        started_at = time.time()
+        for number in range(self.base_display, self.base_display + self.size):
+            display = self._start_display(number)
+            if not display:
+                self.stop()
+                return False
+            self.displays.append(display)
+        print(f"✅ Xvfb显示器池就绪: {[d.name for d in self.displays]}，耗时 {time.time() - started_at:.2f} 秒")
+        return True
+
+    def _start_display(self, number):
+        self._cleanup(number)
+        print(f"启动Xvfb虚拟显示器: DISPLAY=:{number}")
+        # 加上了GLX扩展，这可能是之前成功的关键
+        cmd = ['Xvfb', f':{number}', '-screen', self.screen, self.resolution, '-ac', '+extension', 'GLX']
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except OSError as e:
+            print(f"❌ 启动Xvfb时出错: {e}")
+            return None
+
+        if self._wait_ready(number, process):
+            return XvfbDisplay(number, process)
+
+        if process.poll() is None:
+            process.kill()
+        stderr_output = process.stderr.read().decode(errors='replace')
+        print(f"❌ Xvfb启动失败 (:{number}): {stderr_output}")
+        return None
+
+    def _wait_ready(self, number, process):
+        """轮询连接显示器的 X socket，能连上即表示就绪"""
+        socket_path = os.path.join(X11_SOCKET_DIR, f'X{number}')
+        deadline = time.time() + self.ready_timeout
+        delay = 0.005
+        while time.time() < deadline:
+            if process.poll() is not None:
+                return False
+            if os.path.exists(socket_path):
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    try:
+                        sock.connect(socket_path)
+                        return True
+                    except OSError:
+                        pass
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        return False
+
+    def _cleanup(self, number):
+        """清理占用该显示器编号的残留 Xvfb 进程及其锁文件"""
+        try:
+            subprocess.run(['pkill', '-f', f'Xvfb :{number} '],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+        except OSError:
+            pass
+        lock_path = f'/tmp/.X{number}-lock'
+        deadline = time.time() + 2
+        while os.path.exists(lock_path) and time.time() < deadline:
+            time.sleep(0.02)
+        for path in (lock_path, os.path.join(X11_SOCKET_DIR, f'X{number}')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def acquire(self):
+        """分配当前使用者最少的显示器，返回形如 ':99' 的显示器名"""
+        with self._lock:
+            if not self.displays:
+                raise RuntimeError("Xvfb显示器池尚未启动")
+            display = min(self.displays, key=lambda d: d.users)
+            display.users += 1
+            return display.name
+
+    def release(self, name):
+        with self._lock:
+            for display in self.displays:
+                if display.name == name and display.users > 0:
+                    display.users -= 1
+
+    def stop(self):
+        """停止全部显示器"""
+        for display in self.displays:
+            if display.process.poll() is None:
+                print(f"停止Xvfb进程 ({display.name})...")
+                display.process.terminate()
+                try:
+                    display.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    display.process.kill()
+        self.displays = []